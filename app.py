@@ -2,32 +2,42 @@ import functools
 import geocoder
 import json
 import os
-import redis
 from urllib.parse import urlparse
 
 import flask
 from flask import Flask, Response
 from flask import current_app, session
 from flask import jsonify
-from flask import redirect, render_template, request
+from flask import abort, redirect, render_template, request
 from flask import url_for
-from flask_session import Session
 import google.oauth2.credentials
 import google_auth_oauthlib.flow
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import ObjectDeletedError
 
 from config.app_config import app_config
 from controllers.event_controller import EventController
+from controllers.squad_controller import SquadController
 from controllers.user_controller import UserController
+from helpers.cursor_helper import decode_cursor, encode_cursor
 from helpers.env_helper import is_prod
-from helpers.jinja_helper import relpath, round_ct, pluralize, filter_url_params, update_url_params
+from helpers.jinja_helper import relpath, round_ct, pluralize, filter_url_params, update_url_params, url_state
 from helpers.geo_helper import get_geo, set_geo
+from helpers.http_cache_helper import conditional
+from helpers.redis_helper import get_redis
 from helpers.secret_helper import get_secret
-from models.base import db_session
-from models.block import Block
+from helpers.session_helper import init_session, session_stats
+from helpers.stream_helper import DeferredVargs, stream_flush, stream_template
+from helpers.template_helper import configure_templates
+from models.base import db_session, pool_stats
 from models.follow import Follow
+from models.open_hours import OpenHours
+from models.page_version import PageVersion
+from models.social_graph import SocialGraph
 from models.tag import Tag
 from models.user import User
 from models.user_event import UserEvent
+from models.user_stats import UserStats
 from utils.config_utils import load_config
 from utils.get_from import get_from
 
@@ -47,10 +57,9 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
 # response.set_cookie('username', 'flask', secure=True, httponly=True, samesite='Lax')
 
 #TODO check these config settings
-redis_url = os.getenv('REDIS_URL', 'redis://redis:6379/')
 app.config['SESSION_TYPE'] = 'redis'
-app.config['SESSION_REDIS'] = redis.from_url(redis_url)
-app.config['TEMPLATES_AUTO_RELOAD'] = True
+app.config['SESSION_REDIS'] = get_redis()
+configure_templates(app)
 
 app.jinja_env.globals.update(get_from=get_from)
 app.jinja_env.globals.update(pluralize=pluralize)
@@ -58,17 +67,21 @@ app.jinja_env.globals.update(relpath=relpath)
 app.jinja_env.globals.update(round_ct=round_ct)
 app.jinja_env.globals.update(update_url_params=update_url_params)
 app.jinja_env.globals.update(filter_url_params=filter_url_params)
+app.jinja_env.globals.update(url_state=url_state)
+app.jinja_env.globals.update(stream_flush=stream_flush)
 app.jinja_env.globals.update(get_secret=get_secret)
 app.jinja_env.globals.update(app_panel_types=Tag.types)
 
 import functools
 url_for = functools.partial(url_for, _external=True, _scheme='https')
 
-Session(app)
+init_session(app)
 
 param_to_kwarg = {
+  'after': 'after',
   'c': 'category',
   'f': 'flags',
+  'feed': 'feed',
   'interested': 'interested',
   'lat': 'lat',
   'lon': 'lon',
@@ -89,6 +102,9 @@ TEMPLATE_EVENT_CARD       = "events/_event_card.html"
 TEMPLATE_EVENT_PAGE       = "events/_event_page.html"
 TEMPLATE_EVENT_PAGE_BODY  = "events/_event_page_body.html"
 
+TEMPLATE_SQUADS           = "squads/_squads.html"
+TEMPLATE_SQUAD_PAGE       = "squads/_squad_page.html"
+
 TEMPLATE_USERS            = "users/_users.html"
 TEMPLATE_USERS_LIST       = "users/_users_list.html"
 TEMPLATE_USER_CARD        = "users/_user_card.html"
@@ -126,6 +142,25 @@ def redirect_url(default='/'):
 def debug():
   user_info = UserController()._request_user_info()
 
+# Per-process internals, not served in production
+def debug_only(fn):
+  @functools.wraps(fn)
+  def decorated_fn(*args, **kwargs):
+    if is_prod():
+      abort(404)
+    return fn(*args, **kwargs)
+  return decorated_fn
+
+@app.route("/debug/db_pool/", methods=['GET'])
+@debug_only
+def debug_db_pool():
+  return jsonify(pool_stats())
+
+@app.route("/debug/session/", methods=['GET'])
+@debug_only
+def debug_session():
+  return jsonify(session_stats())
+
 @app.route("/auth/", methods=['GET'])
 def auth_callback():
   if 'state' not in session:
@@ -202,6 +237,14 @@ def logout():
 def shutdown_session(exception=None):
    db_session.remove()
 
+@app.errorhandler(IntegrityError)
+@app.errorhandler(ObjectDeletedError)
+def session_user_deleted(e):
+  db_session.rollback()
+  if UserController().logout_if_deleted():
+    return redirect('/')
+  raise e
+
 def _parse_chip(chips=[], **kwargs):
   if chips is None: chips = []
   is_selected = False
@@ -275,7 +318,6 @@ def _parse_chips(
 
 def _render_events_list(
   request,
-  events,
   vargs,
   scroll=False,
   template=TEMPLATE_EVENTS
@@ -283,9 +325,27 @@ def _render_events_list(
   if request.is_xhr:
     if scroll:
       template = TEMPLATE_EVENTS_LIST
-      if not events: return ''
+      if not vargs['events']: return ''
     return render_template(template, vargs=vargs, **vargs)
-  return render_template(TEMPLATE_MAIN, template=template, vargs=vargs, **vargs)
+  # Full pages stream, templates read everything but the current user through vargs
+  return stream_template(TEMPLATE_MAIN, template=template, vargs=vargs, current_user=vargs['current_user'])
+
+# Only anonymous explore is shared, feeds of users are personal
+# Feeds filter on the clock (open now, upcoming, ended), so their ETags roll over every local hour
+def _time_bucket():
+  now = OpenHours.local_now()
+  return [now.date().isoformat(), OpenHours.hour_of_week(now)]
+
+def _explore_etag(**kwargs):
+  if 'user' in session: return None
+
+  versions = PageVersion.get(PageVersion.EVENTS, PageVersion.INTERESTS)
+  if versions is None: return None
+  return [
+    'explore', request.is_xhr, request.full_path,
+    get_from(session, ['latlon']), get_from(session, ['city']),
+    versions, _time_bucket()
+  ]
 
 def parse_url_params(fn):
   @functools.wraps(fn)
@@ -357,7 +417,18 @@ def paginated(fn):
     return fn(*args, **kwargs)
   return decorated_fn
 
+# What an event page shows, read from Redis so a 304 never touches Postgres
+def _event_etag(event_id):
+  viewer_id = get_from(session, ['user', 'user_id'])
+  names = [PageVersion.EVENTS, PageVersion.event(event_id)]
+  if viewer_id: names.append(PageVersion.user(viewer_id))
+
+  versions = PageVersion.get(*names)
+  if versions is None: return None
+  return ['event', request.is_xhr, event_id, viewer_id, get_from(session, ['user', 'image_url']), versions]
+
 @app.route("/event/<int:event_id>/", methods=['GET'])
+@conditional(_event_etag)
 def event(event_id):
   event = EventController().get_event(event_id=event_id)
   current_user = UserController().current_user
@@ -393,7 +464,8 @@ def event_update(event_id):
 
   event = EventController().update_event(
     event_id=event_id,
-    interest_key=interest_key
+    interest_key=interest_key,
+    user_event_count=request.form.get('ct', default=None, type=int) if is_card else None
   )
 
   if event:
@@ -432,16 +504,99 @@ def event_update(event_id):
 @parse_url_params
 @parse_geo
 @paginated
+@conditional(_explore_etag)
 def events(
   query=None, category=None, tag=None, cities=None, flags=None,
   page=1, next_page_url=None, prev_page_url=None,
   lat=None, lon=None,
-  scroll=False, selected=None
+  scroll=False, selected=None, feed=None
 ):
   selected_categories = category
 
   current_user = UserController().current_user
 
+  if tag == Tag.TVM:
+    cities = None
+
+  # Deferred so the page shell streams out before the feed queries run
+  def load_vargs():
+    events, categories, tags, event_cities = EventController().get_events(
+      query=query,
+      categories=category,
+      tags=tag,
+      cities=cities,
+      flags=flags,
+      page=page,
+      feed=feed
+    )
+
+    chips = _parse_chips(
+      selected_categories = selected_categories,
+      categories=categories,
+      tags=tags,
+      cities=event_cities,
+      flags=flags
+    )
+
+    return {
+      'events': events,
+      'selected': selected,
+      'chips': chips,
+      'page': page,
+      'next_page_url': next_page_url,
+      'prev_page_url': prev_page_url,
+      'next_api_url': _api_events_url(page+1) if len(events) >= EventController.PAGE_SIZE else None
+    }
+
+  vargs = DeferredVargs(load_vargs, current_user=current_user)
+  return _render_events_list(request, vargs, scroll=scroll, template=TEMPLATE_EXPLORE)
+
+# Explore params of the current request, minus the paging ones
+def _events_args(**kwargs):
+  args = {k: v for k,v in request.args.items() if k not in ('cursor', 'p', 'scroll')}
+  args.update(kwargs)
+  return args
+
+def _api_events_url(page):
+  return flask.url_for('api_events', **_events_args(cursor=encode_cursor(page)))
+
+# What the client needs to fill in templates/events/_event_card_template.html
+def _event_card_json(event, urls, selected):
+  chips = [
+    {
+      'chip_name': chip_name,
+      'url': urls.update(toggle={key: chip_name}, remove={'q': chip_name}, clear=["scroll","p"]),
+      'selected': chip_name in selected[key]
+    }
+    for key, chip_names in [('c', event.category_names()), ('t', event.tag_names())]
+    for chip_name in sorted(chip_names, key=lambda x: (x not in selected[key], x))
+  ]
+
+  return {
+    'event_id': event.event_id,
+    'url': flask.url_for('event', event_id=event.event_id),
+    'display_name': event.display_name,
+    'display_address': event.display_address,
+    'img_url': event.img_url,
+    'accolades': bool(event.accolades),
+    'user_count': event.card_user_count or 0,
+    'user_count_display': round_ct(event.card_user_count or 0),
+    'chips': chips
+  }
+
+# Scroll pages of explore as card fields, skipping the facets the page already shows
+@app.route("/api/events/", methods=['GET'])
+@parse_url_params
+@parse_geo
+def api_events(
+  query=None, category=None, tag=None, cities=None, flags=None,
+  lat=None, lon=None, feed=None, **kwargs
+):
+  cursor = decode_cursor(request.args.get('cursor', default=None, type=str))
+  if cursor is None:
+    return jsonify({'error': "Invalid cursor"}), 400
+  page = cursor[0]
+
   if tag == Tag.TVM:
     cities = None
 
@@ -451,28 +606,24 @@ def events(
     tags=tag,
     cities=cities,
     flags=flags,
-    page=page
-  )
-
-  chips = _parse_chips(
-    selected_categories = selected_categories,
-    categories=categories,
-    tags=tags,
-    cities=event_cities,
-    flags=flags
+    page=page,
+    feed=feed,
+    facets=False
   )
 
-  vargs = {
-    'current_user': current_user,
-    'events': events,
-    'selected': selected,
-    'chips': chips,
-    'page': page,
-    'next_page_url': next_page_url,
-    'prev_page_url': prev_page_url
+  urls = url_state(flask.url_for('events', **_events_args()))
+  selected = {
+    'c': set(category.split(',')) if category else set(),
+    't': set(tag.split(',')) if tag else set()
   }
+  next_page = page+1 if len(events) >= EventController.PAGE_SIZE else None
 
-  return _render_events_list(request, events, vargs, scroll=scroll, template=TEMPLATE_EXPLORE)
+  return jsonify({
+    'events': [_event_card_json(event, urls, selected) for event in events],
+    'cursor': encode_cursor(next_page) if next_page else None,
+    'next_url': _api_events_url(next_page) if next_page else None,
+    'page_url': flask.url_for('events', **_events_args(p=page))
+  })
 
 @app.route("/users/", methods=['GET'])
 @parse_url_params
@@ -480,7 +631,7 @@ def events(
 @oauth2_required
 def users(
   query=None, tag=None, flags=None,
-  page=1, next_page_url=None, prev_page_url=None,
+  page=1, next_page_url=None, prev_page_url=None, after=None,
   scroll=False, selected=None
 ):
   current_user = UserController().current_user
@@ -490,9 +641,19 @@ def users(
   users, relationship_types = UserController().get_users(
     query=query,
     tag=tag,
-    page=page
+    page=page,
+    after=int(after) if after else None
   )
 
+  if len(users) >= UserController.PAGE_SIZE:
+    next_page_url = parse_url_for(
+      'users',
+      query=query, tag=tag, selected=selected,
+      after=users[-1].user_id
+    )
+  else:
+    next_page_url = None
+
   chips = {
     'tags': _parse_chip(
       [
@@ -510,13 +671,75 @@ def users(
   vargs = {
     'users': users,
     'selected': selected,
-    'chips': chips
+    'chips': chips,
+    'next_page_url': next_page_url
   }
 
   if request.is_xhr:
+    if scroll:
+      template = TEMPLATE_USERS_LIST
+      if not users: return ''
     return render_template(template, vargs=vargs, **vargs)
   return render_template(TEMPLATE_MAIN, template=template, vargs=vargs, **vargs)
 
+@app.route("/squads/", methods=['GET'])
+@oauth2_required
+def squads():
+  vargs = {
+    'current_user': UserController().current_user,
+    'squads': SquadController().get_squads(),
+    'invites': SquadController().get_invites()
+  }
+
+  if request.is_xhr:
+    return render_template(TEMPLATE_SQUADS, vargs=vargs, **vargs)
+  return render_template(TEMPLATE_MAIN, template=TEMPLATE_SQUADS, vargs=vargs, **vargs)
+
+@app.route("/squads/", methods=['POST'])
+@oauth2_required
+def squads_create():
+  squad = SquadController().create_squad(request.form.get('name'))
+  if squad:
+    return redirect(url_for('squad', squad_id=squad.squad_id))
+  return redirect(request.referrer or '/')
+
+@app.route("/squad/<int:squad_id>/", methods=['GET'])
+@oauth2_required
+@parse_url_params
+@paginated
+def squad(
+  squad_id,
+  page=1, next_page_url=None, prev_page_url=None,
+  scroll=False, selected=None, **kwargs
+):
+  squad, events = SquadController().get_squad_events(squad_id, page=page)
+  if squad is None:
+    return redirect(url_for('squads'))
+
+  vargs = {
+    'current_user': UserController().current_user,
+    'squad': squad,
+    'members': SquadController().get_members(squad_id),
+    'events': events,
+    'page': page,
+    'next_page_url': next_page_url,
+    'prev_page_url': prev_page_url
+  }
+
+  return _render_events_list(request, vargs, scroll=scroll, template=TEMPLATE_SQUAD_PAGE)
+
+@app.route("/squad/<int:squad_id>/", methods=['POST'])
+@oauth2_required
+def squad_update(squad_id):
+  action = request.form.get('action')
+
+  if action == 'accept':
+    SquadController().accept_invite(squad_id)
+  elif action == 'invite':
+    SquadController().invite(squad_id, request.form.get('email'))
+
+  return redirect(url_for('squad', squad_id=squad_id))
+
 @app.route("/saved/", methods=['GET'])
 @oauth2_required
 @parse_url_params
@@ -550,11 +773,13 @@ def user(
   user = UserController().get_user(identifier)
 
   if user:
+    stats = UserStats.get(user, current_user)
+
     events = []
     categories = []
     tags = []
     event_cities = []
-    if not Block.blocks(user.user_id, current_user_id):
+    if not stats.is_blocked_either:
       events, categories, tags, event_cities = EventController().get_events_for_user_by_interested(
         user=user,
         query=query,
@@ -588,16 +813,12 @@ def user(
     }
 
     if user.user_id == current_user_id:
-      return _render_events_list(request, events, vargs, scroll=scroll)
+      return _render_events_list(request, vargs, scroll=scroll)
     else:
       vargs['user'] = user
-      user.card_follower_count = user.follower_users_count()
-      user.card_event_count = user.active_user_events_count()
-      user.card_is_followed = user.is_follows_user(current_user) if current_user else False
-      user.card_is_following = current_user.is_follows_user(user) if current_user else False
-      user.card_is_blocked = current_user.is_blocks_user(user) if current_user else False
+      stats.apply(user)
 
-      return _render_events_list(request, events, vargs, template=TEMPLATE_USER_PAGE, scroll=scroll)
+      return _render_events_list(request, vargs, template=TEMPLATE_USER_PAGE, scroll=scroll)
   return redirect(request.referrer or '/')    
 
 @app.route("/user/<identifier>/", methods=['POST'])
@@ -616,7 +837,7 @@ def user_update(identifier):
 
   if u:
     events = []
-    if not Block.blocks(u.user_id, current_user_id):
+    if not SocialGraph.get().blocks_either(u.user_id, current_user_id):
       events = EventController().get_events_for_user_by_interested(
         user=u,
         interested=UserEvent.INTERESTED
@@ -628,8 +849,8 @@ if __name__ == '__main__':
   port = int(os.environ.get("PORT", 5000))
 
   if is_prod():
-    # TODO: Remove debug when staging is setup
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Production is served by gunicorn, see config/gunicorn.py
+    os.execvp('gunicorn', ['gunicorn', '--config', 'config/gunicorn.py', 'app:app'])
   else:
     # app.run(host='0.0.0.0', port=port, ssl_context='adhoc', debug=True)
     import ssl
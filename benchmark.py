@@ -0,0 +1,264 @@
+import argparse
+import contextlib
+import subprocess
+import sys
+
+from flask import g, render_template, session
+from sqlalchemy import func
+
+from app import app, _parse_chips, TEMPLATE_EVENTS_LIST
+from controllers.event_controller import EventController
+from controllers.user_controller import UserController
+from helpers import template_helper
+from helpers.cursor_helper import encode_cursor
+from helpers.jinja_helper import update_url_params, UrlState
+from models.base import db_session
+from models.data.seed_synthetic import SeedSynthetic
+from models.event import Event
+from models.event_ranker import EventRanker, PersonalizedRanker
+from models.follow import Follow
+from models.user import User
+from utils.benchmark_utils import Benchmark, BenchmarkSuite
+from utils.benchmark_utils import compare_results, load_results, print_comparison, save_results
+
+suite = BenchmarkSuite("eventfinder")
+
+def bench_user():
+  synthetic_user_ids = SeedSynthetic.synthetic_users().with_entities(User.user_id)
+  row = db_session.query(
+    Follow.user_id,
+    func.count(Follow.follow_id).label('ct')
+  ).filter(
+    Follow.user_id.in_(synthetic_user_ids),
+    Follow.active == True
+  ).group_by(
+    Follow.user_id
+  ).order_by(
+    func.count(Follow.follow_id).desc()
+  ).first()
+
+  if row is None:
+    raise Exception("No synthetic users found, run `python -m models.data.seed_synthetic` first")
+  return User.query.filter(User.user_id == row[0]).first()
+
+@contextlib.contextmanager
+def request_context(path="/explore/", user=None):
+  with app.test_request_context(path):
+    app.preprocess_request()
+    if user is not None:
+      session['user'] = user.to_json()
+    yield
+    db_session.remove()
+
+def anonymous():
+  return request_context("/explore/")
+
+def logged_in(path="/explore/"):
+  return lambda: request_context(path, user=bench_user())
+
+@suite.benchmark("event_controller.get_events.anonymous", context=anonymous)
+def bench_get_events_anonymous():
+  EventController().get_events(page=1)
+
+@suite.benchmark("event_controller.get_events.user", context=logged_in())
+def bench_get_events_user():
+  EventController().get_events(page=1)
+
+@suite.benchmark("event_controller.get_events.user.filtered", context=logged_in())
+def bench_get_events_user_filtered():
+  EventController().get_events(categories="eat", tags="sushi", flags="accolades", page=1)
+
+@suite.benchmark("event_controller.get_events.user.scroll", context=logged_in())
+def bench_get_events_user_scroll():
+  EventController().get_events(page=2, facets=False)
+
+@suite.benchmark("event_controller.get_events.user.foryou", context=logged_in())
+def bench_get_events_user_foryou():
+  PersonalizedRanker.invalidate(bench_user().user_id)
+  EventController().get_events(page=1, feed=EventRanker.FOR_YOU)
+
+@suite.benchmark("event_controller.get_events_for_user_by_interested", context=logged_in())
+def bench_get_events_for_user_by_interested():
+  EventController().get_events_for_user_by_interested(interested="interested", page=1)
+
+@suite.benchmark("event_controller._tags_for_events", context=anonymous)
+def bench_tags_for_events():
+  events = db_session.query(
+    Event,
+    func.count(Event.event_id).label('ct')
+  ).group_by(
+    Event.event_id
+  )
+  EventController._tags_for_events(events=events, selected_categories=set(), selected_tags=set())
+
+@suite.benchmark("user_controller.get_users.following", context=logged_in("/users/"))
+def bench_get_users_following():
+  UserController().get_users(tag=User.FOLLOWING, page=1)
+
+@suite.benchmark("user_controller.get_users.followers", context=logged_in("/users/"))
+def bench_get_users_followers():
+  UserController().get_users(tag=User.FOLLOWER, page=1)
+
+# A request's worth of lookups, each new request starts without the cached user
+@suite.benchmark("user_controller.current_user", context=logged_in())
+def bench_current_user():
+  g.pop('current_user', None)
+  for i in range(5):
+    UserController().current_user
+
+BENCH_URL = "/explore/?c=eat&t=sushi,ramen&selected=t&f=accolades&p=2&q=sushi"
+
+@suite.benchmark("jinja_helper.update_url_params", kind=Benchmark.MICRO, warmup=100, repeat=50, number=200)
+def bench_update_url_params():
+  update_url_params(BENCH_URL, toggle={'t': 'ramen'}, remove={'q': 'ramen'}, clear=["scroll", "p"])
+
+BENCH_CHIPS = ["chip{}".format(i) for i in range(50)]
+
+# A page's worth of chip links off one parsed url, as _chips.html and _event_tags.html build them
+@suite.benchmark("jinja_helper.url_state.update", kind=Benchmark.MICRO, warmup=10, repeat=50, number=20)
+def bench_url_state_update():
+  urls = UrlState(BENCH_URL)
+  for card in range(4):
+    for chip in BENCH_CHIPS:
+      urls.update(toggle={'t': chip}, remove={'q': chip}, clear=["scroll", "p"])
+
+class RenderEventsList:
+  def __init__(self, path="/explore/", inline=None):
+    self.path = path
+    self.inline = inline
+
+  @contextlib.contextmanager
+  def __call__(self):
+    inline_templates = app.jinja_env.globals['inline_templates']
+    if self.inline is not None:
+      if self.inline: template_helper.build()
+      app.jinja_env.globals['inline_templates'] = self.inline
+
+    with request_context(self.path, user=bench_user()):
+      events, categories, tags, event_cities = EventController().get_events(page=1)
+      self.vargs = {
+        'current_user': UserController().current_user,
+        'events': events,
+        'chips': _parse_chips(categories=categories, tags=tags, cities=event_cities),
+        'page': 1,
+        'next_page_url': None,
+        'prev_page_url': None
+      }
+      yield
+    app.jinja_env.globals['inline_templates'] = inline_templates
+
+  def render(self):
+    render_template(TEMPLATE_EVENTS_LIST, vargs=self.vargs, **self.vargs)
+
+# Card includes against the macro built by helpers.template_helper
+for name, inline in [
+  ("template.events_list", None),
+  ("template.events_list.include", False),
+  ("template.events_list.inline", True)
+]:
+  render_events_list = RenderEventsList(inline=inline)
+  suite.add(Benchmark(name, render_events_list.render, context=render_events_list))
+
+class RouteBenchmark:
+  GEO = {'latlon': [37.7749, -122.4194], 'city': "San Francisco"}
+
+  def __init__(self, path, user=False, xhr=False):
+    self.path = path
+    self.user = user
+    # Scroll requests come from jquery and get the partial
+    self.headers = {'X-Requested-With': 'XMLHttpRequest'} if xhr else {}
+
+  @contextlib.contextmanager
+  def __call__(self):
+    with app.test_client() as self.client:
+      # Seed geo so the route does not geocode over the network
+      with self.client.session_transaction() as s:
+        s.update(self.GEO)
+        if self.user:
+          s['user'] = bench_user().to_json()
+          s['credentials'] = {}
+      yield
+
+  def get(self):
+    # Full pages stream, reading the body is what renders them
+    self.client.get(self.path, headers=self.headers).get_data()
+
+  # Time to the first streamed chunk, the page shell
+  def first_byte(self):
+    response = self.client.get(self.path, headers=self.headers, buffered=False)
+    next(response.iter_encoded())
+    response.close()
+
+for name, path, user, xhr in [
+  ("route.explore.anonymous", "/explore/", False, False),
+  ("route.explore.user", "/explore/", True, False),
+  ("route.explore.user.scroll", "/explore/?p=2&scroll=true", True, True),
+  ("route.api.events.user", "/api/events/?cursor={}".format(encode_cursor(2)), True, True),
+  ("route.users.following", "/users/?t=following", True, False)
+]:
+  route = RouteBenchmark(path, user=user, xhr=xhr)
+  suite.add(Benchmark(
+    name,
+    route.get,
+    context=route,
+    warmup=1,
+    repeat=5
+  ))
+
+route = RouteBenchmark("/explore/", user=True)
+suite.add(Benchmark(
+  "route.explore.user.first_byte",
+  route.first_byte,
+  context=route,
+  warmup=1,
+  repeat=5
+))
+
+# Cold start of a fresh interpreter, what a gunicorn master pays before it can fork workers
+class StartupBenchmark:
+  def __init__(self, code):
+    self.code = code
+
+  def run(self):
+    subprocess.check_call([sys.executable, "-c", self.code])
+
+for name, code in [
+  ("startup.import", "import app"),
+  ("startup.preload", "from app import app; from helpers.preload_helper import preload; preload(app)")
+]:
+  startup = StartupBenchmark(code)
+  suite.add(Benchmark(
+    name,
+    startup.run,
+    warmup=0,
+    repeat=3
+  ))
+
+def run(names=None, kind=None, warmup=None, repeat=None, output=None, baseline=None, threshold=0.1, fail_on_regression=False):
+  results = suite.run(names=names, kind=kind, warmup=warmup, repeat=repeat)
+
+  if output:
+    save_results(results, output)
+    print("Saved results to {}".format(output))
+
+  if baseline:
+    comparisons = compare_results(results, load_results(baseline), threshold=threshold)
+    print_comparison(comparisons)
+    if fail_on_regression and any(c['status'] == 'regressed' for c in comparisons.values()):
+      return 1
+  return 0
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--names', action="store", nargs="*")
+  parser.add_argument('--kind', action="store", choices=[Benchmark.MICRO, Benchmark.MACRO])
+  parser.add_argument('--warmup', action="store", type=int)
+  parser.add_argument('--repeat', action="store", type=int)
+  parser.add_argument('--output', action="store")
+  parser.add_argument('--baseline', action="store")
+  parser.add_argument('--threshold', action="store", type=float, default=0.1)
+  parser.add_argument('--fail_on_regression', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  sys.exit(run(**args))
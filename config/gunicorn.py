@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+
+# gunicorn --config config/gunicorn.py app:app
+# Graceful reload of workers: kill -HUP <master pid>
+# The app is preloaded in the master, so new code needs a new master: kill -USR2, then -TERM the old one
+
+# Read by models.base when the app is preloaded, so set before that
+os.environ.setdefault('DB_STATEMENT_TIMEOUT_MS', '30000')
+
+bind = "0.0.0.0:{}".format(os.getenv('PORT', 5000))
+
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()*2+1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then, jittered so they don't all restart at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests//10
+
+accesslog = '-'
+errorlog = '-'
+
+def when_ready(server):
+  from app import app
+  from helpers.preload_helper import preload
+  preload(app)
+  server.log.info("Preloaded templates and indexes")
+
+def post_fork(server, worker):
+  from models.base import dispose_after_fork
+  # Drop pooled connections inherited from the master, each worker opens its own
+  dispose_after_fork()
\ No newline at end of file
@@ -6,22 +6,36 @@ from flask import current_app, request, session
 import sqlalchemy as sa
 from sqlalchemy import alias, asc, case, cast, desc, distinct, nullslast
 from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.orm import joinedload
 from sqlalchemy.sql import func
 
 from controllers.user_controller import UserController
 from helpers.geo_helper import get_geo
+from helpers.replica_helper import reads_from_replica
 from models.base import db_session
 from models.connector_event import ConnectorEvent
 from models.event import Event
+from models.event_card import EventCard
+from models.event_payload import EventPayload
+from models.event_ranker import EventRanker
+from models.event_similarity import EventSimilarity
 from models.event_tag import EventTag
 from models.follow import Follow
+from models.interest_queue import InterestQueue
+from models.open_hours import OpenHours
+from models.page_version import PageVersion
+from models.squad_feed import SquadFeed
 from models.tag import Tag
 from models.user import User
 from models.user_event import UserEvent
+from models.user_stats import UserStats
 from utils.get_from import get_from
 
 class EventController:
   PAGE_SIZE = 48
+  SIMILAR_EVENTS = 6
+  UPCOMING_DAYS = 14
 
   @classmethod
   def _filter_events(klass, events, query=None, categories=None, tags=None, flags=None):
@@ -63,10 +77,50 @@ class EventController:
 
     return events, tags
 
+  # Bitwise test against the compiled weekly hours, true if open during any of the hours
+  @classmethod
+  def _open_during(klass, hours):
+    def bits(x):
+      return cast(x, BIT(OpenHours.HOURS_PER_WEEK))
+
+    return Event.open_hours.op('&')(bits(OpenHours.mask(hours))) != bits(OpenHours.mask([]))
+
+  @classmethod
+  def _weekend_window(klass, now):
+    # On a Sunday this lands on yesterday, the weekend already in progress
+    saturday = datetime.datetime(now.year, now.month, now.day)
+    saturday += datetime.timedelta(days=5-now.weekday())
+    return max(now, saturday), saturday+datetime.timedelta(days=2)
+
   @classmethod
   def _filter_events_by_flags(klass, events, flags):
     if Tag.ACCOLADES in flags:
       events = events.filter(Event.accolades != None)
+    if Tag.OPEN_NOW in flags:
+      events = events.filter(
+        klass._open_during([OpenHours.hour_of_week(OpenHours.local_now())])
+      )
+    if Tag.UPCOMING in flags:
+      now = datetime.datetime.now()
+      events = events.filter(
+        and_(
+          Event.start_time >= now,
+          Event.start_time < now+datetime.timedelta(days=klass.UPCOMING_DAYS)
+        )
+      )
+    if Tag.WEEKEND in flags:
+      window_start, window_end = klass._weekend_window(datetime.datetime.now())
+      # Dated events overlap the weekend, places with known hours are open some time during it
+      events = events.filter(
+        and_(
+          or_(Event.start_time == None, Event.start_time < window_end),
+          or_(Event.end_time == None, Event.end_time >= window_start),
+          or_(
+            Event.open_hours == None,
+            klass._open_during(range(6*24, 8*24))
+          )
+        )
+      )
     if Tag.NEARBY in flags:
       geo_latlon, geo_city = get_geo()
 
@@ -102,7 +156,7 @@ class EventController:
     return events.filter(
       or_(
         Event.name.ilike("%{}%".format(query)),
-        cast(Event.description, sa.Text).ilike("%{}%".format(query)),
+        Event.payload.has(cast(EventPayload.description, sa.Text).ilike("%{}%".format(query))),
         cast(Event.accolades, sa.Text).ilike("%{}%".format(query)),
         Event.venue_name.ilike("%{}%".format(query)),
         cast(Event.address, sa.Text).ilike("%{}%".format(query)),
@@ -282,6 +336,11 @@ class EventController:
 
     return tags, categories
 
+  # Same rows with just the ids and counts, the counts are the second entity of every events query
+  @classmethod
+  def _event_ids_with_counts(klass, events):
+    return events.with_entities(Event.event_id, events.column_descriptions[1]['expr'])
+
   @classmethod
   def _order_events(klass, query):
     return query.order_by(
@@ -297,10 +356,10 @@ class EventController:
     page,
     query=None, cities=None, user=None, flags=None,
     selected_tags=None, selected_categories=None,
-    future_only=None
+    future_only=None, ranker=None, rank_key=None, facets=True
   ):
     if future_only:
-      events_with_counts = events_with_counts.filter(
+      events = events.filter(
         or_(
           Event.start_time >= datetime.datetime.now(),
           Event.end_time >= datetime.datetime.now()
@@ -315,7 +374,8 @@ class EventController:
       flags=flags
     )
 
-    event_cities = klass._cities_for_events(events)
+    # Chips don't change while scrolling, so later pages can skip the facet aggregations
+    event_cities = klass._cities_for_events(events) if facets else []
     if cities:
       events = events.filter(
         Event.city.in_(cities)
@@ -323,15 +383,20 @@ class EventController:
       for city in event_cities:
         city['selected'] = city['chip_name'] in cities
 
-    tags, categories = klass._tags_for_events(
-      events=events,
-      selected_categories=selected_categories,
-      selected_tags=selected_tags
-    )
+    tags, categories = [], []
+    if facets:
+      tags, categories = klass._tags_for_events(
+        events=events,
+        selected_categories=selected_categories,
+        selected_tags=selected_tags
+      )
 
+    # Cards only show the following count, so scroll pages skip looking up who
     event_user_ids = None
-    if user:
-      event_ids = {e[0].event_id for e in events if e[1]}
+    if user and facets:
+      event_ids = {
+        event_id for event_id, user_count in klass._event_ids_with_counts(events) if user_count
+      }
 
       following_user_ids = alias(
         db_session.query(
@@ -373,16 +438,33 @@ class EventController:
         row[0]: set(str(follower_id) for follower_id in row[1]) for row in events_with_following_counts
       }
 
-    events = klass._order_events(events)
-    events = events.limit(
-      klass.PAGE_SIZE
-    ).offset(
-      (page-1)*klass.PAGE_SIZE
-    )
+    if ranker and not ranker.is_sql:
+      ranked_event_ids = ranker.rank(events, user=user, cache_key=rank_key)
+      page_event_ids = ranked_event_ids[(page-1)*klass.PAGE_SIZE:page*klass.PAGE_SIZE]
+      page_event_order = {event_id: i for i, event_id in enumerate(page_event_ids)}
+      events = klass._event_ids_with_counts(events).filter(Event.event_id.in_(page_event_ids))
+      rows = sorted(events, key=lambda row: page_event_order[row[0]])
+    else:
+      events = klass._order_events(klass._event_ids_with_counts(events))
+      events = events.limit(
+        klass.PAGE_SIZE
+      ).offset(
+        (page-1)*klass.PAGE_SIZE
+      )
+      rows = events.all()
+
+    # Cards carry only what the page renders, instead of whole Event rows and their JSON
+    page_event_ids = [event_id for event_id, ct in rows]
+    cards = EventCard.get_cards(page_event_ids)
+    # ct orders by every interaction, cards show the interested count that update_event patches
+    user_counts = klass._user_counts(page_event_ids)
 
     results = []
-    for event, user_count in events:
-      event.card_user_count = user_count
+    for event_id, ct in rows:
+      event = get_from(cards, [event_id])
+      if event is None: continue
+
+      event.card_user_count = user_counts.get(event_id, 0)
       if event_user_ids and event.event_id in event_user_ids:
         event.card_event_users = [
           event_users[x] for x in event_user_ids[event.event_id] if x in event_users
@@ -391,10 +473,33 @@ class EventController:
 
     return results, categories, tags, event_cities, events
 
+  # Users interested in each event, matching UserEvent.is_counted
+  @classmethod
+  def _user_counts(klass, event_ids):
+    if not event_ids: return {}
+    return dict(db_session.query(
+      UserEvent.event_id,
+      func.count(UserEvent.user_id)
+    ).filter(
+      and_(
+        UserEvent.event_id.in_(event_ids),
+        UserEvent.interest>UserEvent.interest_level(UserEvent.SKIP),
+        UserEvent.interest<=(max(UserEvent.DONE_LEVELS))
+      )
+    ).group_by(
+      UserEvent.event_id
+    ))
+
   def get_event(self, event_id):
-    event = Event.query.filter(Event.event_id == event_id).first()
+    # The only page that shows description and details
+    event = Event.query.options(
+      joinedload(Event.payload)
+    ).filter(
+      Event.event_id == event_id
+    ).first()
     if not event: return None
 
+    user_event_count_delta = 0
     user = UserController().current_user
     if user:
       user_event = UserEvent.query.filter(
@@ -404,6 +509,18 @@ class EventController:
         )
       ).first()
 
+      if InterestQueue.is_enabled():
+        is_pending, pending_interest = InterestQueue.pending(user.user_id, event.event_id)
+        if is_pending:
+          applied_interest = user_event.interest if user_event else None
+          user_event_count_delta = UserEvent.is_counted(pending_interest)-UserEvent.is_counted(applied_interest)
+          # Transient copy, so the pending interest is never flushed from here
+          user_event = UserEvent(
+            user_id=user.user_id,
+            event_id=event.event_id,
+            interest=pending_interest
+          )
+
       if user_event:
         event.current_user_event=user_event
 
@@ -427,27 +544,44 @@ class EventController:
         } for u in following_event_users
       ]
 
-    user_event_count = UserEvent.query.filter(
-      and_(
-        UserEvent.event_id==event_id,
-        UserEvent.interest>UserEvent.interest_level(UserEvent.SKIP),
-        UserEvent.interest<=(max(UserEvent.DONE_LEVELS))
-      )
-    ).count()
+    user_event_count = self._user_counts([event_id]).get(event_id, 0)
 
-    event.card_user_count = user_event_count
+    event.card_user_count = max(0, user_event_count+user_event_count_delta)
+
+    similar_event_ids = EventSimilarity.similar_ids(event.event_id, limit=self.SIMILAR_EVENTS)
+    if similar_event_ids:
+      similar_events = {
+        e.event_id: e for e in Event.query.filter(Event.event_id.in_(similar_event_ids))
+      }
+      event.card_similar_events = [
+        similar_events[x] for x in similar_event_ids if x in similar_events
+      ]
 
     return event
 
+  @reads_from_replica
   def get_events(
     self,
     query=None, categories=None, tags=None, cities=None, flags=None,
-    page=1, future_only=False
+    page=1, future_only=False, feed=None, facets=True
   ):
     current_user = UserController().current_user
     selected_categories = set(categories.split(',') if categories else [])
     selected_tags = set(tags.split(',') if tags else [])
 
+    # Personalized feeds need a user to personalize for
+    ranker = EventRanker.get(feed if current_user else None)
+    rank_key = None
+    if not ranker.is_sql:
+      rank_key = ranker.filter_key(
+        query=query,
+        categories=selected_categories,
+        tags=selected_tags,
+        cities=cities,
+        flags=flags,
+        future_only=future_only
+      )
+
     events_with_counts = db_session.query(
       Event,
       func.count(func.distinct(UserEvent.user_id)).label('ct')
@@ -477,12 +611,16 @@ class EventController:
       selected_categories=selected_categories,
       selected_tags=selected_tags,
       flags=flags,
-      future_only=future_only
+      future_only=future_only,
+      ranker=ranker,
+      rank_key=rank_key,
+      facets=facets
     )
 
     return results, categories, tags, event_cities
 
   # TODO Can this be combined with get_events?
+  @reads_from_replica
   def get_events_for_user_by_interested(
     self,
     interested,
@@ -558,9 +696,13 @@ class EventController:
 
     return results, categories, tags, event_cities
 
-  def update_event(self, event_id, interest_key):
+  def update_event(self, event_id, interest_key, user_event_count=None):
     user_id = UserController().current_user_id
     if user_id:
+      if InterestQueue.is_enabled():
+        event = self._update_event_write_behind(user_id, event_id, interest_key, user_event_count)
+        if event is not None: return event
+
       user_event = UserEvent.query.filter(
         and_(
           UserEvent.user_id==user_id,
@@ -569,15 +711,7 @@ class EventController:
       ).first()
 
       if user_event:
-        if interest_key == UserEvent.DONE:
-          if user_event.interest_key == interest_key:
-            user_event.interest = user_event.interest-2
-          else:
-            user_event.interest = user_event.interest+2
-        elif user_event.interest_key == interest_key:
-          user_event.interest = None
-        else:
-          user_event.interest = UserEvent.interest_level(interest_key)
+        user_event.interest = UserEvent.next_interest(user_event.interest, interest_key)
         db_session.merge(user_event)
       else:
         user_event = UserEvent(
@@ -586,7 +720,49 @@ class EventController:
           interest=UserEvent.interest_level(interest_key)
         )
         db_session.add(user_event)
+      db_session.flush()
+      UserStats.refresh_counters([user_id], commit=False)
       db_session.commit()
+      EventRanker.invalidate_user(user_id)
+      SquadFeed.invalidate_user(user_id)
+      PageVersion.bump_interest(user_id, event_id)
+
+      return self.get_event(event_id)
+    return None
+
+  # Queues the change for models.data.interest_worker, None falls back to a direct write
+  def _update_event_write_behind(self, user_id, event_id, interest_key, user_event_count=None):
+    event = Event.query.filter(Event.event_id == event_id).first()
+    if not event: return None
+
+    is_pending, interest = InterestQueue.pending(user_id, event_id)
+    if not is_pending:
+      row = db_session.query(
+        UserEvent.interest
+      ).filter(
+        and_(
+          UserEvent.user_id==user_id,
+          UserEvent.event_id==event_id
+        )
+      ).first()
+      interest = row[0] if row else None
 
+    next_interest = UserEvent.next_interest(interest, interest_key)
+    if not InterestQueue.enqueue(user_id, event_id, next_interest): return None
+    EventRanker.invalidate_user(user_id)
+    PageVersion.bump_interest(user_id, event_id)
+
+    if user_event_count is None:
       return self.get_event(event_id)
-    return None
\ No newline at end of file
+
+    # Render cards from the optimistic state, patching the count the card already showed
+    event.current_user_event = UserEvent(
+      user_id=user_id,
+      event_id=event_id,
+      interest=next_interest
+    )
+    event.card_user_count = max(
+      0,
+      user_event_count+UserEvent.is_counted(next_interest)-UserEvent.is_counted(interest)
+    )
+    return event
\ No newline at end of file
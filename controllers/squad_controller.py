@@ -1,9 +1,183 @@
 from flask import session
+from sqlalchemy import and_, desc, nullslast
+from sqlalchemy.sql import func
 
+from controllers.user_controller import UserController
+from models.base import db_session
+from models.event import Event
 from models.squad import Squad
+from models.squad_feed import SquadFeed
+from models.squad_invite import SquadInvite
 from models.squad_user import SquadUser
+from models.user import User
+from models.user_event import UserEvent
 
 from utils.get_from import get_from
 
 class SquadController:
-  pass
\ No newline at end of file
+  PAGE_SIZE = 48
+
+  def _is_member(self, squad_id, user_id):
+    return db_session.query(
+      SquadUser.query.filter(
+        and_(
+          SquadUser.squad_id == squad_id,
+          SquadUser.user_id == user_id
+        )
+      ).exists()
+    ).scalar()
+
+  def get_squads(self, user=None):
+    if user is None: user = UserController().current_user
+    if user is None: return []
+
+    return Squad.query.join(
+      SquadUser,
+      SquadUser.squad_id == Squad.squad_id
+    ).filter(
+      SquadUser.user_id == user.user_id
+    ).order_by(
+      Squad.name
+    ).all()
+
+  def get_squad(self, squad_id):
+    user_id = UserController().current_user_id
+    if not user_id or not self._is_member(squad_id, user_id): return None
+    return Squad.query.filter(Squad.squad_id == squad_id).first()
+
+  def get_invites(self, user=None):
+    if user is None: user = UserController().current_user
+    if user is None: return []
+
+    return SquadInvite.query.filter(
+      and_(
+        func.lower(SquadInvite.email) == user.email.lower(),
+        SquadInvite.user_id == None
+      )
+    ).all()
+
+  def create_squad(self, name):
+    user = UserController().current_user
+    if user is None or not name: return None
+
+    squad = Squad(name=name)
+    db_session.add(squad)
+    db_session.flush()
+    db_session.add(SquadUser(squad_id=squad.squad_id, user_id=user.user_id))
+    db_session.commit()
+    return squad
+
+  def invite(self, squad_id, email):
+    squad = self.get_squad(squad_id)
+    if squad is None or not email: return None
+
+    db_session.merge(SquadInvite(squad_id=squad.squad_id, email=email.strip()))
+    db_session.commit()
+    return squad
+
+  def accept_invite(self, squad_id):
+    user = UserController().current_user
+    if user is None: return None
+
+    invite = SquadInvite.query.filter(
+      and_(
+        SquadInvite.squad_id == squad_id,
+        func.lower(SquadInvite.email) == user.email.lower()
+      )
+    ).first()
+    if invite is None: return None
+
+    invite.user_id = user.user_id
+    db_session.merge(SquadUser(squad_id=squad_id, user_id=user.user_id))
+    db_session.commit()
+    SquadFeed.invalidate(squad_id)
+
+    return self.get_squad(squad_id)
+
+  def get_members(self, squad_id):
+    members = SquadFeed.get(squad_id, 'members')
+    if members is None:
+      members = [
+        {
+          'user_id': u.user_id,
+          'username': u.username,
+          'image_url': u.image_url
+        } for u in User.query.join(
+          SquadUser,
+          SquadUser.user_id == User.user_id
+        ).filter(
+          SquadUser.squad_id == squad_id
+        ).order_by(
+          User.username
+        )
+      ]
+      SquadFeed.set(squad_id, 'members', members)
+    return members
+
+  # Events ranked by how many members are interested, one grouped query per page
+  def _rank_squad_events(self, squad_id, page):
+    rows = db_session.query(
+      UserEvent.event_id,
+      func.count(UserEvent.user_id).label('ct'),
+      func.array_agg(UserEvent.user_id).label('user_ids')
+    ).join(
+      SquadUser,
+      and_(
+        SquadUser.user_id == UserEvent.user_id,
+        SquadUser.squad_id == squad_id
+      )
+    ).join(
+      Event,
+      Event.event_id == UserEvent.event_id
+    ).filter(
+      UserEvent.interest.in_(UserEvent.INTERESTED_LEVELS)
+    ).group_by(
+      UserEvent.event_id,
+      Event.end_time
+    ).order_by(
+      desc('ct'),
+      nullslast(Event.end_time.desc()),
+      UserEvent.event_id
+    ).limit(
+      self.PAGE_SIZE
+    ).offset(
+      (page-1)*self.PAGE_SIZE
+    )
+    return [[event_id, ct, user_ids] for event_id, ct, user_ids in rows]
+
+  def get_squad_events(self, squad_id, page=1):
+    squad = self.get_squad(squad_id)
+    if squad is None: return None, []
+
+    ranked = SquadFeed.get(squad_id, "page:{}".format(page))
+    if ranked is None:
+      ranked = self._rank_squad_events(squad_id, page)
+      SquadFeed.set(squad_id, "page:{}".format(page), ranked)
+    if not ranked: return squad, []
+
+    event_ids = [x[0] for x in ranked]
+    events_by_id = {e.event_id: e for e in Event.query.filter(Event.event_id.in_(event_ids))}
+
+    current_user_id = UserController().current_user_id
+    current_user_events = {
+      x.event_id: x for x in UserEvent.query.filter(
+        and_(
+          UserEvent.user_id == current_user_id,
+          UserEvent.event_id.in_(event_ids)
+        )
+      )
+    }
+
+    members = {m['user_id']: m for m in self.get_members(squad_id)}
+
+    results = []
+    for event_id, ct, user_ids in ranked:
+      event = get_from(events_by_id, [event_id])
+      if event is None: continue
+
+      event.card_user_count = ct
+      event.card_event_users = [members[x] for x in user_ids if x in members]
+      event.current_user_event = get_from(current_user_events, [event_id])
+      results.append(event)
+
+    return squad, results
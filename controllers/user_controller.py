@@ -1,26 +1,34 @@
+import bisect
 import httplib2
 import json
 
 import flask
-from flask import current_app, session
+from flask import current_app, g, session
 import google.oauth2.credentials
-from googleapiclient.discovery import build
-from sqlalchemy import alias, and_, or_
-from sqlalchemy.sql import func
+from sqlalchemy import and_, nullslast, or_
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 
+from helpers.google_helper import authorized_http, get_service
+from helpers.replica_helper import reads_from_replica
 from models.base import db_session
 from models.auth import Auth
 from models.block import Block
 from models.follow import Follow
+from models.page_version import PageVersion
+from models.social_graph import SocialGraph
 from models.user import User
-from models.user_event import UserEvent
 from models.user_auth import UserAuth
+from models.user_counter import UserCounter
+from models.user_stats import UserStats
+from models.user_suggestion import UserSuggestion
 
 from utils.config_utils import load_config
 from utils.get_from import get_from
 
 class UserController:
   PAGE_SIZE = 48
+  # Ids matched against usernames per query when a relationship list is searched
+  ID_CHUNK_SIZE = 1000
 
   #TODO: Make sure that you can't set your username to a number to get another person's account
   def _get_user(self, identifier):
@@ -33,15 +41,16 @@ class UserController:
   def _logout(self):
     session.clear()
     session.modified = True
+    g.pop('current_user', None)
 
   def _request_user_info(self):
     credentials = google.oauth2.credentials.Credentials(**session['credentials'])
 
-    people_service = build('people', 'v1', credentials=credentials)
+    people_service = get_service('people', 'v1')
     profile = people_service.people().get(
       resourceName='people/me',
       personFields='names,emailAddresses,photos'
-    ).execute()
+    ).execute(http=authorized_http(credentials))
 
     primary_email = profile['emailAddresses'][0]
     for cur_email in profile['emailAddresses']:
@@ -68,7 +77,9 @@ class UserController:
       'image_url': primary_photo['url'],
     }
 
-    row_user_auth = UserAuth.query.filter(
+    row_user_auth = UserAuth.query.options(
+      joinedload(UserAuth.user)
+    ).filter(
       and_(
         UserAuth.auth_key==Auth.GOOGLE,
         UserAuth.auth_id==google_auth_id
@@ -88,12 +99,14 @@ class UserController:
       db_session.commit()
     else:
       row_user = row_user_auth.user
-      for k,v in user.items():
-        setattr(row_user, k, v)
-      db_session.merge(row_user)
-      db_session.commit()
+      # Profiles rarely change between logins, only write the fields that did
+      changed = {k: v for k,v in user.items() if getattr(row_user, k) != v}
+      if changed:
+        for k,v in changed.items():
+          setattr(row_user, k, v)
+        db_session.commit()
 
-    session['user'] = row_user.to_json()
+    self.set_current_user(row_user)
 
     return session['user']
 
@@ -107,7 +120,11 @@ class UserController:
       active = active
     )
     db_session.merge(row_block)
+    db_session.flush()
+    UserStats.refresh_counters([current_user.user_id, user.user_id], commit=False)
     db_session.commit()
+    SocialGraph.get().set_block(current_user.user_id, user.user_id, active)
+    PageVersion.bump(PageVersion.user(current_user.user_id), PageVersion.user(user.user_id))
 
     return self._get_user(identifier)
 
@@ -118,17 +135,39 @@ class UserController:
       user_id = session['user']['user_id']
     return user_id
 
+  # Once per request, rebuilt from the user json in the session instead of queried
   @property
   def current_user(self):
+    if 'current_user' not in g:
+      user = self._session_user()
+      if not user:
+        self._logout()
+      g.current_user = user
+    return g.current_user
+
+  def _session_user(self):
+    user_json = get_from(session, ['user'])
+    if not user_json: return None
+
+    columns = User.__table__.columns.keys()
+    user = User(**{k: v for k,v in user_json.items() if k in columns})
+    # Attach as if loaded, columns missing from an older session json load lazily
+    make_transient_to_detached(user)
+    return db_session.merge(user, load=False)
+
+  # The session user isn't checked against the db, so an account deleted since sign in
+  # surfaces as ObjectDeletedError or a foreign key error instead. Logs out if that's the case
+  def logout_if_deleted(self):
     user_id = self.current_user_id
-    user = None
-    if user_id:
-      user = User.query.filter(User.user_id == user_id).first()
+    if user_id is None: return False
+    if db_session.query(User.user_id).filter(User.user_id == user_id).first(): return False
+    self._logout()
+    return True
 
-    if not user:
-      self._logout()
-
-    return user
+  # Call after changing the signed in user's row, so the session and this request see it
+  def set_current_user(self, user):
+    session['user'] = user.to_json()
+    g.current_user = user
 
   def follow_user(self, identifier, active):
     current_user = self.current_user
@@ -140,174 +179,152 @@ class UserController:
       active = active
     )
     db_session.merge(row_follow)
+    db_session.flush()
+    UserStats.refresh_counters([user.user_id], commit=False)
     db_session.commit()
+    SocialGraph.get().set_follow(current_user.user_id, user.user_id, active)
+    # Event pages list the followed users who are interested
+    PageVersion.bump(PageVersion.user(current_user.user_id))
 
     return self._get_user(identifier)
 
-  def get(self, user=None, relationship_type=None, query=None, limit=None, table_only=False):
+  def get(self, user=None, relationship_type=None, query=None, page=1, after=None):
     if user is None: user = self.current_user
     if user is None: return []
 
-    users = []
+    user_ids = self.get_ids(user=user, relationship_type=relationship_type, query=query, page=page, after=after)
+    if not user_ids: return []
+    return User.query.filter(User.user_id.in_(user_ids)).order_by(User.user_id).all()
+
+  # One page of related user ids in user_id order, paged from the in-memory graph
+  # so only the page's ids go to postgres
+  def get_ids(self, user=None, relationship_type=None, query=None, page=1, after=None):
+    if user is None: user = self.current_user
+    if user is None: return []
+
+    graph = SocialGraph.get()
+
+    user_ids = []
     if relationship_type == User.BLOCKED:
-      users = user.blocked_users()
+      user_ids = graph.blocked_ids(user.user_id)
     elif relationship_type == User.FOLLOWER:
-      users = user.follower_users()
+      user_ids = graph.follower_ids(user.user_id)
     elif relationship_type == User.FOLLOWING:
-      users = user.following_users()
+      user_ids = graph.following_ids(user.user_id)
     elif relationship_type == User.SUGGESTED:
-      users = self.get_suggested(user=user, query=query)
-
-    if query:
-      users = users.filter(User.username.ilike("{}%".format(query)))
-
-    if limit:
-        users = users.limit(limit)
-
-    if table_only: return users
-    return users.all()
-
-  # TODO: Add ranking algorithm
-  def get_suggested(self, user=None, query=None):
+      user_ids = sorted(x.user_id for x in self.get_suggested(user=user, query=query))
+
+    return self._page_ids(user_ids, query=query, page=page, after=after)
+
+  # user_ids must be sorted
+  def _page_ids(self, user_ids, query=None, page=1, after=None):
+    # Keyset pagination on user_id, falls back to offset for page links
+    offset = 0
+    if after is not None:
+      user_ids = user_ids[bisect.bisect_right(user_ids, after):]
+    elif page:
+      offset = (page-1)*self.PAGE_SIZE
+    end = offset+self.PAGE_SIZE
+
+    if not query:
+      return list(user_ids[offset:end])
+
+    # Usernames live in postgres, match a chunk of ids at a time until the page fills
+    matched = []
+    for i in range(0, len(user_ids), self.ID_CHUNK_SIZE):
+      matched.extend(x for x, in db_session.query(
+        User.user_id
+      ).filter(
+        User.user_id.in_(user_ids[i:i+self.ID_CHUNK_SIZE]),
+        User.username.ilike("{}%".format(query))
+      ).order_by(
+        User.user_id
+      ).limit(
+        end-len(matched)
+      ))
+      if len(matched) >= end: break
+    return matched[offset:end]
+
+  # Reads the top-K ranked by models.data.transform_user_suggestions, in rank order
+  def get_suggested(self, user=None, query=None, limit=None):
     if user is None: user = self.current_user
     if user is None: return []
 
-    already_following_user_ids = alias(
-      db_session.query(
-        Follow.follow_id
-      ).select_from(
-        Follow
-      ).filter(
-        and_(
-          Follow.user_id == user.user_id,
-          Follow.active
-        )
-      ),
-      'already_following_user_ids'
+    suggested_users = db_session.query(
+      User
+    ).join(
+      UserSuggestion,
+      UserSuggestion.suggest_id == User.user_id
+    ).filter(
+      UserSuggestion.user_id == user.user_id
+    ).order_by(
+      UserSuggestion.rank
     )
+    if query:
+      suggested_users = suggested_users.filter(User.username.ilike("{}%".format(query)))
 
-    blocking_user_ids = alias(
-      user.all_blocks_table(),
-      'blocking_user_ids'
-    )
+    # Drop anyone followed or blocked since the last ranking run, at most TOP_K rows to check
+    excluded_user_ids = SocialGraph.get().excluded_suggestion_ids(user.user_id)
+    suggested_users = [x for x in suggested_users if x.user_id not in excluded_user_ids]
 
-    suggested_users = db_session.query(
+    # Not ranked yet, or nothing left to suggest, so onboarding isn't empty
+    if not suggested_users:
+      suggested_users = self._popular_users(excluded_user_ids, query=query, limit=UserSuggestion.TOP_K)
+
+    return suggested_users[:limit] if limit else suggested_users
+
+  # Most followed users, then newest, without excluded_user_ids
+  def _popular_users(self, excluded_user_ids, query=None, limit=UserSuggestion.TOP_K):
+    popular_users = db_session.query(
       User
-    ).filter(
-      and_(
-        User.user_id != user.user_id,
-        ~User.user_id.in_(already_following_user_ids),
-        ~User.user_id.in_(blocking_user_ids)
-      )
+    ).outerjoin(
+      UserCounter,
+      UserCounter.user_id == User.user_id
+    ).order_by(
+      nullslast(UserCounter.follower_count.desc()),
+      User.user_id.desc()
     )
+    if query:
+      popular_users = popular_users.filter(User.username.ilike("{}%".format(query)))
 
-    return suggested_users
+    # Enough rows that limit remain after the exclusions, without sending them to postgres
+    popular_users = popular_users.limit(limit+len(excluded_user_ids))
+    return [x for x in popular_users if x.user_id not in excluded_user_ids][:limit]
 
+  @reads_from_replica
   def get_user(self, identifier):
     return self._get_user(identifier)
 
-  def get_users(self, query=None, tag=None, page=1):
+  @reads_from_replica
+  def get_users(self, query=None, tag=None, page=1, after=None):
     current_user = self.current_user
 
     relationship_types = User.relationship_types()
 
-    users_table=None
+    users = []
     if tag and tag in relationship_types:
-      users_table = self.get(
-        relationship_type=tag,
-        query=query,
-        table_only=True
-      )
-
       if tag == User.FOLLOWING:
-        suggested_users_table = self.get(
-          relationship_type=User.SUGGESTED,
-          query=query,
-          table_only=True,
-          limit=5
-        )
-        users_table = users_table.union(suggested_users_table)
-
-    if users_table:
-      if page:
-        users_table = users_table.limit(
-          self.PAGE_SIZE
-        ).offset(
-          (page-1)*self.PAGE_SIZE
-        )
-      users = users_table.all()
-    else:
-      users = []
-
-    if users:
-      all_user_ids = set(u.user_id for u in users)
-
-      event_counts_by_user_id = db_session.query(
-        UserEvent.user_id,
-        func.count(UserEvent.event_id).label('ct')
-      ).filter(
-        and_(
-          UserEvent.user_id.in_(all_user_ids),
-          UserEvent.interest.in_(UserEvent.INTERESTED_LEVELS)
-        )
-      ).group_by(
-        UserEvent.user_id
-      )
-      event_counts_by_user_id = {str(x[0]): x[1] for x in event_counts_by_user_id}
-
-      follower_counts_by_user_id = db_session.query(
-        Follow.follow_id,
-        func.count(Follow.user_id).label('ct')
-      ).filter(
-        and_(
-          Follow.follow_id.in_(all_user_ids),
-          Follow.active == True
+        # The top suggestions are listed along with the followed users
+        user_ids = sorted(
+          set(SocialGraph.get().following_ids(current_user.user_id))
+          | {x.user_id for x in self.get_suggested(query=query, limit=5)}
         )
-      ).group_by(
-        Follow.follow_id
-      )
-      follower_counts_by_user_id = {str(x[0]): x[1] for x in follower_counts_by_user_id}
-      
-      is_follower_by_user_id = db_session.query(
-        Follow.follow_id
-      ).filter(
-        and_(
-          Follow.follow_id == current_user.user_id,
-          Follow.user_id.in_(all_user_ids),
-          Follow.active == True
-        )
-      )
-      is_follower_by_user_id = set(str(x[0]) for x in is_follower_by_user_id)
+        user_ids = self._page_ids(user_ids, query=query, page=page, after=after)
+      else:
+        user_ids = self.get_ids(relationship_type=tag, query=query, page=page, after=after)
 
-      is_following_by_user_id = db_session.query(
-        Follow.follow_id
+      users_with_stats = db_session.query(
+        User,
+        *UserStats.columns(User.user_id, current_user.user_id)
       ).filter(
-        and_(
-          Follow.user_id == current_user.user_id,
-          Follow.follow_id.in_(all_user_ids),
-          Follow.active == True
-        )
-      )
-      is_following_by_user_id = set(str(x[0]) for x in is_following_by_user_id)
-
-      is_blocked_by_user_id = db_session.query(
-        Block.block_id
-      ).filter(
-        and_(
-          Block.user_id == current_user.user_id,
-          Block.block_id.in_(all_user_ids),
-          Block.active == True
-        )
-      )
-      is_blocked_by_user_id = set(str(x[0]) for x in is_blocked_by_user_id)
+        User.user_id.in_(user_ids)
+      ).order_by(
+        User.user_id
+      ) if user_ids else []
 
-      for user in users:
-        uid = str(user.user_id)
-        user.card_event_count       = get_from(event_counts_by_user_id, [uid], 0)
-        user.card_follower_count    = get_from(follower_counts_by_user_id, [uid], 0)
-        user.card_is_follower       = uid in is_follower_by_user_id
-        user.card_is_following      = uid in is_following_by_user_id
-        user.card_is_blocked        = uid in is_blocked_by_user_id
+      for row in users_with_stats:
+        user = row[0]
+        UserStats(user.user_id, *row[1:]).apply(user)
 
         if not (
           user.card_is_follower
@@ -315,5 +332,6 @@ class UserController:
           or user.card_is_blocked
         ):
           user.card_is_suggested = True
+        users.append(user)
 
     return users, relationship_types
\ No newline at end of file
@@ -0,0 +1,20 @@
+import os
+
+from hashids import Hashids
+
+_hashids = None
+
+def get_hashids():
+  global _hashids
+  if _hashids is None:
+    _hashids = Hashids(salt=os.getenv('CURSOR_SALT', 'event_finder'), min_length=8)
+  return _hashids
+
+# Opaque cursor over a tuple of non negative ints, so clients can't craft or depend on its contents
+def encode_cursor(*values):
+  return get_hashids().encode(*values)
+
+def decode_cursor(cursor):
+  if not cursor: return None
+  values = get_hashids().decode(cursor)
+  return values or None
@@ -0,0 +1,64 @@
+import argparse
+import os
+import threading
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import DISCOVERY_URI, build_from_document
+
+DISCOVERY_DIR = os.getenv(
+  'GOOGLE_DISCOVERY_DIR',
+  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'discovery')
+)
+# Services the app calls, bundled by `python -m helpers.google_helper`
+SERVICES = [('people', 'v1')]
+
+_services = {}
+_services_lock = threading.Lock()
+
+def discovery_path(name, version, discovery_dir=DISCOVERY_DIR):
+  return os.path.join(discovery_dir, "{}.{}.json".format(name, version))
+
+def fetch_discovery(name, version):
+  resp, content = httplib2.Http().request(DISCOVERY_URI.format(api=name, apiVersion=version))
+  if resp.status >= 400:
+    raise Exception("Discovery document for {} {} returned {}".format(name, version, resp.status))
+  return content.decode('utf-8')
+
+def save_discovery(name, version, discovery_dir=DISCOVERY_DIR):
+  path = discovery_path(name, version, discovery_dir=discovery_dir)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'w') as f:
+    f.write(fetch_discovery(name, version))
+  return path
+
+# The bundled document, fetched and saved once if it wasn't bundled
+def load_discovery(name, version):
+  path = discovery_path(name, version)
+  if not os.path.exists(path):
+    try:
+      save_discovery(name, version)
+    except OSError:
+      return fetch_discovery(name, version)
+  with open(path) as f:
+    return f.read()
+
+# A client built once per process, its requests run with the caller's credentials:
+# service.people().get(...).execute(http=authorized_http(credentials))
+def get_service(name, version):
+  key = (name, version)
+  with _services_lock:
+    if key not in _services:
+      _services[key] = build_from_document(load_discovery(name, version), http=httplib2.Http())
+    return _services[key]
+
+def authorized_http(credentials):
+  return google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--discovery_dir', action="store", default=DISCOVERY_DIR)
+  args = vars(parser.parse_args())
+
+  for name, version in SERVICES:
+    print("Saved {}".format(save_discovery(name, version, **args)))
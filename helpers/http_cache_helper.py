@@ -0,0 +1,46 @@
+import functools
+import hashlib
+import json
+import os
+import time
+
+from flask import current_app, make_response, request, session
+
+# Templates and static urls change with a deploy, the gunicorn master sets this once for all workers
+APP_VERSION = os.getenv('APP_VERSION') or str(int(time.time()))
+CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+
+def make_etag(parts):
+  return hashlib.sha1(json.dumps([APP_VERSION, parts], default=str).encode('utf-8')).hexdigest()
+
+def set_cache_headers(response, etag, public=False):
+  response.set_etag(etag)
+  # Pages and their xhr partials share urls, and anonymous pages still depend on the session
+  response.vary.update(['Cookie', 'X-Requested-With'])
+  if public:
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+  else:
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+  return response
+
+# Answers If-None-Match before running the view, etag_parts gets the view's arguments
+# and returns what the page depends on, or None to skip caching
+def conditional(etag_parts):
+  def decorator(fn):
+    @functools.wraps(fn)
+    def decorated_fn(*args, **kwargs):
+      parts = etag_parts(*args, **kwargs)
+      if parts is None: return fn(*args, **kwargs)
+
+      etag = make_etag(parts)
+      public = 'user' not in session
+      if request.if_none_match.contains(etag):
+        return set_cache_headers(current_app.response_class(status=304), etag, public=public)
+
+      response = make_response(fn(*args, **kwargs))
+      if response.status_code != 200: return response
+      return set_cache_headers(response, etag, public=public)
+    return decorated_fn
+  return decorator
@@ -1,7 +1,7 @@
 import re
 
 from sigfig import round
-from flask import current_app
+from flask import current_app, g, has_request_context, request
 from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
 
 def relpath(url):
@@ -23,100 +23,133 @@ def pluralize(ct, singular_str, plural_str=None):
   else: counter_str = plural_str
   return "{} {}".format(ct, counter_str)
 
+class UrlState:
+  """A url parsed once, with memoized transforms for building chip links from it"""
+
+  def __init__(self, url):
+    self.url_parts = urlsplit(url)
+    self.params = {k: v for k, v in parse_qsl(self.url_parts.query)}
+    self._split = {}
+    self._cache = {}
+
+  def _values(self, k):
+    if k not in self._split:
+      self._split[k] = tuple(self.params[k].split(','))
+    # Ordered set, fresh per call so transforms never share state
+    return dict.fromkeys(self._split[k])
+
+  def _unsplit(self, url_params):
+    return urlunsplit(
+      [
+        self.url_parts.scheme,
+        self.url_parts.netloc,
+        self.url_parts.path,
+        urlencode(url_params),
+        self.url_parts.fragment
+      ]
+    )
+
+  def _memoize(self, key, fn):
+    try:
+      if key in self._cache: return self._cache[key]
+    except TypeError:
+      return fn()
+    result = self._cache[key] = fn()
+    return result
+
+  @classmethod
+  def _freeze(klass, d):
+    return tuple(sorted(d.items())) if d else None
+
+  def filter(self, include=None, exclude=None):
+    def build():
+      url_params = list(self.params.items())
+      if include:
+        url_params = [p for p in url_params if p[0] in include]
+      if exclude:
+        url_params = [p for p in url_params if p[0] not in exclude]
+      return self._unsplit(url_params)
+
+    key = ('filter', tuple(include) if include else None, tuple(exclude) if exclude else None)
+    return self._memoize(key, build)
+
+  def update(self, merge=None, replace=None, remove=None, clear=None, toggle=None):
+    def build():
+      url_params = dict(self.params)
+      sets = {}
+
+      def values(k):
+        if k not in sets:
+          v = url_params[k]
+          sets[k] = self._values(k) if v is self.params.get(k) else dict.fromkeys(v.split(','))
+        return sets[k]
+
+      if replace:
+        for k,v in replace.items():
+          url_params[k] = v
+          sets.pop(k, None)
+
+      if merge:
+        for k,v in merge.items():
+          merged = values(k) if k in url_params else {}
+          merged.update(dict.fromkeys(v.split(',')))
+          url_params[k] = sets[k] = merged
+
+      if remove:
+        for k,v in remove.items():
+          if k in url_params:
+            remaining = values(k)
+            for x in v.split(','):
+              remaining.pop(x.lower(), None)
+            if not remaining:
+              del url_params[k]
+              del sets[k]
+
+      if toggle:
+        for k,v in toggle.items():
+          toggled = values(k) if k in url_params else {}
+          if v in toggled:
+            del toggled[v]
+          else:
+            toggled[v] = None
+          if not toggled:
+            url_params.pop(k, None)
+            sets.pop(k, None)
+          else:
+            url_params[k] = sets[k] = toggled
+
+      if clear:
+        for k in clear:
+          url_params.pop(k, None)
+          sets.pop(k, None)
+
+      return self._unsplit([
+        (k, ','.join(sets[k]) if k in sets else v) for k,v in url_params.items()
+      ])
+
+    key = (
+      'update',
+      self._freeze(merge),
+      self._freeze(replace),
+      self._freeze(remove),
+      tuple(clear) if clear else None,
+      self._freeze(toggle)
+    )
+    return self._memoize(key, build)
+
+# One UrlState per url per request, so every chip link on a page shares a single parse
+def url_state(url=None):
+  if not has_request_context():
+    return UrlState(url)
+
+  if url is None: url = relpath(request.url)
+  url_states = g.setdefault('url_states', {})
+  if url not in url_states:
+    url_states[url] = UrlState(url)
+  return url_states[url]
+
 def filter_url_params(url, include=None, exclude=None):
-  url_parts = urlsplit(url)
-  url_query = url_parts.query
-  url_params = parse_qsl(url_query)
-  
-  if include:
-    url_params = [p for p in url_params if p[0] in include]
-  if exclude:
-    url_params = [p for p in url_params if p[0] not in exclude]
-
-  filtered_url = urlunsplit(
-    [
-      url_parts.scheme,
-      url_parts.netloc,
-      url_parts.path,
-      urlencode(url_params),
-      url_parts.fragment
-    ]
-  )
-  return filtered_url
+  return url_state(url).filter(include=include, exclude=exclude)
 
 def update_url_params(url, merge=None, replace=None, remove=None, clear=None, toggle=None):
-  url_parts = urlsplit(url)
-  url_query = url_parts.query
-  url_params = parse_qsl(url_query)
-  url_params_dict = { x[0]: x[1] for x in url_params }
-
-  if replace:
-    for k,v in replace.items():
-      url_params_dict[k] = v
-
-  if merge:
-    for k,v in merge.items():
-      v_set = set(v.split(','))
-      if k not in url_params_dict:
-        url_params_dict[k] = set(v_set)
-      else:
-        url_params_dict_v = url_params_dict[k]
-        if url_params_dict_v.__class__ is not set:
-          url_params_dict_v = set(url_params_dict_v.split(','))
-        url_params_dict[k] = url_params_dict_v.union(v_set)
-
-  if remove:
-    for k,v in remove.items():
-      v_set = set([x.lower() for x in v.split(',')])
-      if k in url_params_dict:
-        url_params_dict_v = url_params_dict[k]
-        if url_params_dict_v.__class__ is not set:
-          url_params_dict_v = set(url_params_dict_v.split(','))
-        new_url_params = url_params_dict_v.difference(v_set)
-        if not new_url_params:
-          del url_params_dict[k]
-        else:
-          url_params_dict[k] = new_url_params
-
-  if toggle:
-    for k,v in toggle.items():
-      if k not in url_params_dict:
-        url_params_dict[k] = set(v_set)
-      else:
-        url_params_dict_v = url_params_dict[k]
-        if url_params_dict_v.__class__ is not set:
-          url_params_dict_v = set(url_params_dict_v.split(','))
-
-        if v in url_params_dict_v:
-          url_params_dict_v.remove(v)
-        else:
-          url_params_dict_v.add(v)
-
-        new_url_params = url_params_dict_v
-        if not new_url_params:
-          del url_params_dict[k]
-        else:
-          url_params_dict[k] = new_url_params
-
-  if clear:
-    for k in clear:
-      if k in url_params_dict:
-        del url_params_dict[k]
-
-  url_params = []
-  for k,v in url_params_dict.items():
-    if v.__class__ is set:
-      url_params.append( (k, ','.join(v)) )
-    else:
-      url_params.append( (k,v) )
-
-  filtered_url = urlunsplit(
-    [
-      url_parts.scheme,
-      url_parts.netloc,
-      url_parts.path,
-      urlencode(url_params),
-      url_parts.fragment
-    ]
-  )
-  return filtered_url
\ No newline at end of file
+  return url_state(url).update(merge=merge, replace=replace, remove=remove, clear=clear, toggle=toggle)
\ No newline at end of file
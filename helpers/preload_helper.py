@@ -0,0 +1,21 @@
+from helpers.google_helper import SERVICES, get_service
+from models.base import db_session
+from models.event_recommender import EventRecommender
+from models.event_similarity import EventSimilarity
+from models.social_graph import SocialGraph
+
+# Warms templates and in-memory indexes in the gunicorn master before it forks,
+# so workers start hot and share the pages copy-on-write instead of each loading their own
+def preload(app):
+  for name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(name)
+
+  SocialGraph.get()
+  EventSimilarity.preload()
+  EventRecommender.get()
+
+  for name, version in SERVICES:
+    get_service(name, version)
+
+  # Connections opened here must not be shared with the workers
+  db_session.remove()
\ No newline at end of file
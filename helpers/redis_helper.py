@@ -0,0 +1,14 @@
+import os
+
+import redis
+
+_redis = None
+
+def get_redis_url():
+  return os.getenv('REDIS_URL', 'redis://redis:6379/')
+
+def get_redis():
+  global _redis
+  if _redis is None:
+    _redis = redis.from_url(get_redis_url())
+  return _redis
@@ -0,0 +1,50 @@
+import contextlib
+import functools
+import os
+import time
+
+from flask import has_request_context, session
+
+from models.base import db_session, replica_engine, RoutingSession
+
+# How long after a user's own write their reads stay on the primary, covers replication lag
+REPLICA_WINDOW = int(os.getenv('DATABASE_REPLICA_WINDOW', 10))
+WROTE_AT_KEY = 'db_wrote_at'
+
+def _mark_write(db):
+  if has_request_context():
+    session[WROTE_AT_KEY] = time.time()
+
+RoutingSession.commit_hooks.append(_mark_write)
+
+def can_read_replica():
+  if replica_engine is None: return False
+  if has_request_context():
+    wrote_at = session.get(WROTE_AT_KEY)
+    if wrote_at and time.time()-wrote_at < REPLICA_WINDOW: return False
+  return True
+
+@contextlib.contextmanager
+def _use_replica(value):
+  db = db_session()
+  use_replica = db.use_replica
+  db.use_replica = value
+  try:
+    yield
+  finally:
+    db.use_replica = use_replica
+
+def read_replica():
+  return _use_replica(can_read_replica())
+
+# For reads that must see every commit, even inside @reads_from_replica
+def read_primary():
+  return _use_replica(False)
+
+# For read-only feed, facet and profile queries
+def reads_from_replica(fn):
+  @functools.wraps(fn)
+  def fn_body(*args, **kwargs):
+    with read_replica():
+      return fn(*args, **kwargs)
+  return fn_body
\ No newline at end of file
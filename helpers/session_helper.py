@@ -0,0 +1,221 @@
+import os
+import pickle
+import threading
+import time
+
+import msgpack
+from flask_session.sessions import RedisSession, RedisSessionInterface, total_seconds
+from itsdangerous import BadSignature, want_bytes
+
+from helpers.redis_helper import get_redis
+
+# Rarely changing keys stored under their own redis key and only read when used
+SPLIT_KEYS = ('credentials',)
+# Unchanged sessions are still rewritten this often, to push back their expiry
+REFRESH_INTERVAL = int(os.getenv('SESSION_REFRESH_INTERVAL', 24*60*60))
+
+_session_counters = {
+  'read': 0,
+  'read_bytes': 0,
+  'write': 0,
+  'write_bytes': 0,
+  'skipped_write': 0,
+  'split_read': 0,
+  'split_read_bytes': 0,
+  'split_write': 0,
+  'split_write_bytes': 0
+}
+_session_counters_lock = threading.Lock()
+
+def _count(counter, n_bytes):
+  with _session_counters_lock:
+    _session_counters[counter] += 1
+    _session_counters['{}_bytes'.format(counter)] += n_bytes
+
+# Per-process session traffic, see /debug/session/
+def session_stats():
+  with _session_counters_lock:
+    stats = dict(_session_counters)
+  stats['pid'] = os.getpid()
+  for op in ['read', 'write', 'split_read', 'split_write']:
+    stats['{}_avg_bytes'.format(op)] = stats['{}_bytes'.format(op)]/stats[op] if stats[op] else 0
+  return stats
+
+def dumps(data):
+  return msgpack.packb(data, use_bin_type=True)
+
+def loads(raw):
+  try:
+    return msgpack.unpackb(raw, raw=False)
+  except Exception:
+    # Sessions written by the pickle serializer before this one, rewritten as msgpack on save
+    return pickle.loads(raw)
+
+class CompactRedisSession(RedisSession):
+  """A RedisSession whose split keys load from their own redis key on first use"""
+
+  def __init__(self, initial=None, sid=None, permanent=None, raw=None, split_keys=(), load_split=None, refreshed=None):
+    self.raw = raw
+    self.split_raw = {}
+    self.refreshed = refreshed
+    self._unloaded = set(split_keys)
+    self._load_split = load_split
+    RedisSession.__init__(self, initial, sid=sid, permanent=permanent)
+
+  def _load(self, key):
+    if key not in self._unloaded: return
+    self._unloaded.discard(key)
+    raw = self._load_split(key)
+    if raw is not None:
+      self.split_raw[key] = raw
+      dict.__setitem__(self, key, loads(raw))
+
+  def __getitem__(self, key):
+    self._load(key)
+    return RedisSession.__getitem__(self, key)
+
+  def get(self, key, default=None):
+    self._load(key)
+    return RedisSession.get(self, key, default)
+
+  # Loads a split key to answer, it may have expired without the rest of the session
+  def __contains__(self, key):
+    self._load(key)
+    return RedisSession.__contains__(self, key)
+
+  def __setitem__(self, key, value):
+    self._unloaded.discard(key)
+    RedisSession.__setitem__(self, key, value)
+
+  def __delitem__(self, key):
+    self._load(key)
+    RedisSession.__delitem__(self, key)
+
+  def pop(self, key, *args):
+    self._load(key)
+    return RedisSession.pop(self, key, *args)
+
+  def clear(self):
+    self._unloaded.clear()
+    RedisSession.clear(self)
+
+  def split_keys(self):
+    return sorted(self._unloaded | {k for k in SPLIT_KEYS if dict.__contains__(self, k)})
+
+class CompactRedisSessionInterface(RedisSessionInterface):
+  """flask_session's redis sessions as msgpack, written back only when they change"""
+
+  session_class = CompactRedisSession
+
+  def split_key(self, sid, key):
+    return "{}{}:{}".format(self.key_prefix, sid, key)
+
+  def _sid(self, app, request):
+    sid = request.cookies.get(app.session_cookie_name)
+    if not sid: return None
+    if self.use_signer:
+      signer = self._get_signer(app)
+      if signer is None: return None
+      try:
+        return signer.unsign(sid).decode()
+      except BadSignature:
+        return None
+    return sid
+
+  def open_session(self, app, request):
+    sid = self._sid(app, request)
+    if sid is None:
+      return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+
+    raw = self.redis.get(self.key_prefix + sid)
+    if raw is None:
+      return self.session_class(sid=sid, permanent=self.permanent)
+    _count('read', len(raw))
+
+    try:
+      data = loads(raw)
+    except Exception:
+      return self.session_class(sid=sid, permanent=self.permanent)
+
+    def load_split(key):
+      split_raw = self.redis.get(self.split_key(sid, key))
+      if split_raw is not None: _count('split_read', len(split_raw))
+      return split_raw
+
+    return self.session_class(
+      data,
+      sid=sid,
+      raw=raw,
+      split_keys=data.pop('_split', ()),
+      load_split=load_split,
+      refreshed=data.pop('_refreshed', None)
+    )
+
+  def save_session(self, app, session, response):
+    domain = self.get_cookie_domain(app)
+    path = self.get_cookie_path(app)
+    ttl = total_seconds(app.permanent_session_lifetime)
+
+    split_keys = session.split_keys()
+    if not session and not split_keys:
+      if session.modified:
+        self.redis.delete(self.key_prefix + session.sid, *[self.split_key(session.sid, k) for k in SPLIT_KEYS])
+        response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+      return
+
+    pipe = self.redis.pipeline(transaction=False)
+
+    for key in SPLIT_KEYS:
+      if key in session._unloaded: continue
+      if dict.__contains__(session, key):
+        split_raw = dumps(dict.__getitem__(session, key))
+        if split_raw != session.split_raw.get(key):
+          pipe.setex(name=self.split_key(session.sid, key), value=split_raw, time=ttl)
+          _count('split_write', len(split_raw))
+      elif key in session.split_raw:
+        pipe.delete(self.split_key(session.sid, key))
+
+    data = {k: v for k,v in dict.items(session) if k not in SPLIT_KEYS}
+    if split_keys: data['_split'] = split_keys
+    refreshed = session.refreshed
+    if refreshed is None or time.time()-refreshed >= REFRESH_INTERVAL:
+      refreshed = int(time.time())
+    data['_refreshed'] = refreshed
+    raw = dumps(data)
+
+    is_changed = raw != session.raw
+    if is_changed:
+      pipe.setex(name=self.key_prefix + session.sid, value=raw, time=ttl)
+      # Split keys expire with the session
+      for key in split_keys:
+        pipe.expire(self.split_key(session.sid, key), ttl)
+      _count('write', len(raw))
+    else:
+      with _session_counters_lock:
+        _session_counters['skipped_write'] += 1
+    pipe.execute()
+
+    if not is_changed: return
+
+    if self.use_signer:
+      session_id = self._get_signer(app).sign(want_bytes(session.sid))
+    else:
+      session_id = session.sid
+    response.set_cookie(
+      app.session_cookie_name,
+      session_id,
+      expires=self.get_expiration_time(app, session),
+      httponly=self.get_cookie_httponly(app),
+      domain=domain,
+      path=path,
+      secure=self.get_cookie_secure(app)
+    )
+
+# Replaces flask_session's Session(app) for SESSION_TYPE redis
+def init_session(app):
+  app.session_interface = CompactRedisSessionInterface(
+    app.config.get('SESSION_REDIS') or get_redis(),
+    app.config.get('SESSION_KEY_PREFIX', 'session:'),
+    app.config.get('SESSION_USE_SIGNER', False),
+    app.config.get('SESSION_PERMANENT', True)
+  )
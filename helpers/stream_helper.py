@@ -0,0 +1,63 @@
+import collections.abc
+
+from flask import Response, current_app, g, stream_with_context
+from markupsafe import Markup
+
+STREAM_FLUSH = "<!-- flush -->"
+STREAM_CHUNK_SIZE = 16*1024
+
+class DeferredVargs(collections.abc.Mapping):
+  """vargs built on first use, so a streamed page sends its shell before the queries run"""
+
+  def __init__(self, load, **eager):
+    self._load = load
+    self._eager = eager
+    self._vargs = None
+
+  @property
+  def vargs(self):
+    if self._vargs is None:
+      self._vargs = dict(self._eager)
+      self._vargs.update(self._load())
+    return self._vargs
+
+  def __getitem__(self, k):
+    if self._vargs is None and k in self._eager:
+      return self._eager[k]
+    return self.vargs[k]
+
+  def __iter__(self):
+    return iter(self.vargs)
+
+  def __len__(self):
+    return len(self.vargs)
+
+# Marks where a streamed page flushes what it has so far, renders nothing otherwise
+def stream_flush():
+  return Markup(STREAM_FLUSH) if g.get('streaming') else ''
+
+def _chunks(pieces, chunk_size):
+  buf = []
+  size = 0
+  for piece in pieces:
+    if piece == STREAM_FLUSH:
+      if buf: yield ''.join(buf)
+      buf = []
+      size = 0
+      continue
+
+    buf.append(piece)
+    size += len(piece)
+    if size >= chunk_size:
+      yield ''.join(buf)
+      buf = []
+      size = 0
+  if buf: yield ''.join(buf)
+
+# render_template, but sent in chunks of about chunk_size as the template renders
+def stream_template(template_name, chunk_size=STREAM_CHUNK_SIZE, **context):
+  app = current_app._get_current_object()
+  g.streaming = True
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  return Response(stream_with_context(_chunks(template.generate(context), chunk_size)))
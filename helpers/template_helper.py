@@ -0,0 +1,79 @@
+import argparse
+import os
+import re
+
+from jinja2 import FileSystemBytecodeCache
+
+from helpers.env_helper import is_prod
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+BUILD_DIR = 'build'
+
+# Hot templates rendered once per item in a loop, flattened into a macro by `build`
+# name -> (macro name, macro args)
+INLINED_MACROS = {
+  'events/_event_card.html': ('event_card', ['event', 'card', 'vargs', 'is_me'])
+}
+
+# Only plain includes of a literal name are inlined, dynamic names stay includes
+INCLUDE_RE = re.compile(r'\{%-?\s*include\s+["\']([^"\']+)["\']\s*-?%\}')
+
+def get_cache_dir():
+  return os.getenv('JINJA_CACHE_DIR', '/tmp/jinja_cache')
+
+def built_name(name):
+  return "{}/{}".format(BUILD_DIR, name)
+
+def _read(template_dir, name):
+  with open(os.path.join(template_dir, name)) as f:
+    source = f.read()
+  # Jinja drops a single trailing newline from every template, so does inlining
+  return source[:-1] if source.endswith('\n') else source
+
+# An include with context renders the same as its source pasted in place
+def flatten(name, template_dir=TEMPLATE_DIR, parents=()):
+  if name in parents:
+    raise Exception("Recursive include of {}".format(name))
+  return INCLUDE_RE.sub(
+    lambda m: flatten(m.group(1), template_dir=template_dir, parents=parents+(name,)),
+    _read(template_dir, name)
+  )
+
+def build(template_dir=TEMPLATE_DIR):
+  built = []
+  for name, (macro_name, macro_args) in INLINED_MACROS.items():
+    path = os.path.join(template_dir, built_name(name))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+      f.write("{{% macro {}({}) %}}{}{{% endmacro %}}".format(
+        macro_name,
+        ", ".join(macro_args),
+        flatten(name, template_dir=template_dir)
+      ))
+    built.append(path)
+  return built
+
+def is_built(template_dir=TEMPLATE_DIR):
+  return all(os.path.exists(os.path.join(template_dir, built_name(name))) for name in INLINED_MACROS)
+
+# Production: compiled templates cached on disk, no stat() per render, hot includes inlined if built
+def configure_templates(app):
+  prod = is_prod()
+  app.config['TEMPLATES_AUTO_RELOAD'] = not prod
+
+  if prod:
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+  inline_templates = os.getenv('INLINE_TEMPLATES', '1' if prod else '0') == '1'
+  template_dir = os.path.join(app.root_path, app.template_folder)
+  app.jinja_env.globals.update(inline_templates=inline_templates and is_built(template_dir))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--template_dir', action="store", default=TEMPLATE_DIR)
+  args = vars(parser.parse_args())
+
+  for path in build(**args):
+    print("Built {}".format(path))
@@ -0,0 +1,35 @@
+"""index event times and create event open intervals
+
+Revision ID: 2b6f4e8d1c35
+Revises: 7d3f9a1c6e28
+Create Date: 2026-10-19 18:32:40.117382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+
+# revision identifiers, used by Alembic.
+revision = '2b6f4e8d1c35'
+down_revision = '7d3f9a1c6e28'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_index('events_by_start_time', 'events', ['start_time'])
+  op.create_index('events_by_end_time_and_start_time', 'events', ['end_time', 'start_time'])
+
+  op.create_table(
+    'event_open_intervals',
+    sa.Column('event_id', sa.Integer, ForeignKey('events.event_id'), primary_key=True),
+    sa.Column('open_minute', sa.Integer, primary_key=True),
+    sa.Column('close_minute', sa.Integer, nullable=False)
+  )
+  op.create_index('event_open_intervals_by_open_minute_and_close_minute', 'event_open_intervals', ['open_minute', 'close_minute'])
+
+def downgrade():
+  op.drop_index('event_open_intervals_by_open_minute_and_close_minute', 'event_open_intervals')
+  op.drop_table('event_open_intervals')
+
+  op.drop_index('events_by_end_time_and_start_time', 'events')
+  op.drop_index('events_by_start_time', 'events')
\ No newline at end of file
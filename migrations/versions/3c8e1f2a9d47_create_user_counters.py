@@ -0,0 +1,35 @@
+"""create user counters
+
+Revision ID: 3c8e1f2a9d47
+Revises: 60ac900e6dcc
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+from sqlalchemy.sql import func
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f2a9d47'
+down_revision = '60ac900e6dcc'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    'user_counters',
+    sa.Column('user_id', sa.Integer, ForeignKey('users.user_id'), primary_key=True),
+    sa.Column('follower_count', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('event_count', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=func.now())
+  )
+  op.create_index('follows_by_follow_id_and_active', 'follows', ['follow_id', 'active'])
+  op.create_index('blocks_by_block_id_and_active', 'blocks', ['block_id', 'active'])
+  op.create_index('user_events_by_user_id_and_interest', 'user_events', ['user_id', 'interest'])
+
+def downgrade():
+  op.drop_index('user_events_by_user_id_and_interest', 'user_events')
+  op.drop_index('blocks_by_block_id_and_active', 'blocks')
+  op.drop_index('follows_by_follow_id_and_active', 'follows')
+  op.drop_table('user_counters')
@@ -0,0 +1,35 @@
+"""create event cards
+
+Revision ID: 4f9b2d6e8a17
+Revises: 8c1e5a7f3d92
+Create Date: 2026-10-19 19:48:27.306514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+
+# revision identifiers, used by Alembic.
+revision = '4f9b2d6e8a17'
+down_revision = '8c1e5a7f3d92'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    'event_cards',
+    sa.Column('event_id', sa.Integer, ForeignKey('events.event_id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('display_name', sa.String),
+    sa.Column('img_url', sa.String),
+    sa.Column('display_address', sa.String),
+    sa.Column('accolades', ARRAY(sa.String)),
+    sa.Column('categories', ARRAY(sa.String)),
+    sa.Column('tags', ARRAY(sa.String)),
+    sa.Column('interest_count', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=func.now())
+  )
+
+def downgrade():
+  op.drop_table('event_cards')
\ No newline at end of file
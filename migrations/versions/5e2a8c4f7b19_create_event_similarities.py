@@ -0,0 +1,30 @@
+"""create event similarities
+
+Revision ID: 5e2a8c4f7b19
+Revises: 9b4d2e7c1a53
+Create Date: 2026-10-19 16:27:08.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+
+# revision identifiers, used by Alembic.
+revision = '5e2a8c4f7b19'
+down_revision = '9b4d2e7c1a53'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    'event_similarities',
+    sa.Column('event_id', sa.Integer, ForeignKey('events.event_id'), primary_key=True),
+    sa.Column('similar_event_ids', ARRAY(sa.Integer), nullable=False),
+    sa.Column('scores', ARRAY(sa.Float), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=func.now())
+  )
+
+def downgrade():
+  op.drop_table('event_similarities')
@@ -0,0 +1,48 @@
+"""move event json to event payloads
+
+Revision ID: 6a3c9e1b5d84
+Revises: 4f9b2d6e8a17
+Create Date: 2026-10-19 20:21:09.645130
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+
+# revision identifiers, used by Alembic.
+revision = '6a3c9e1b5d84'
+down_revision = '4f9b2d6e8a17'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    'event_payloads',
+    sa.Column('event_id', sa.Integer, ForeignKey('events.event_id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('description', sa.JSON),
+    sa.Column('details', sa.JSON),
+    sa.Column('meta', sa.JSON)
+  )
+  op.execute("""
+    INSERT INTO event_payloads (event_id, description, details, meta)
+    SELECT event_id, description, details, meta
+    FROM events
+    WHERE description IS NOT NULL OR details IS NOT NULL OR meta IS NOT NULL
+  """)
+
+  op.drop_column('events', 'description')
+  op.drop_column('events', 'details')
+  op.drop_column('events', 'meta')
+
+def downgrade():
+  op.add_column('events', sa.Column('description', sa.JSON))
+  op.add_column('events', sa.Column('details', sa.JSON))
+  op.add_column('events', sa.Column('meta', sa.JSON))
+  op.execute("""
+    UPDATE events
+    SET description = event_payloads.description, details = event_payloads.details, meta = event_payloads.meta
+    FROM event_payloads
+    WHERE event_payloads.event_id = events.event_id
+  """)
+
+  op.drop_table('event_payloads')
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""index squads by user and email
+
+Revision ID: 7d3f9a1c6e28
+Revises: 5e2a8c4f7b19
+Create Date: 2026-10-19 17:45:12.904561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7d3f9a1c6e28'
+down_revision = '5e2a8c4f7b19'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_index('squad_users_by_user_id', 'squad_users', ['user_id'])
+  op.create_index('squad_invites_by_lower_email', 'squad_invites', [sa.text('lower(email)')])
+
+def downgrade():
+  op.drop_index('squad_invites_by_lower_email', 'squad_invites')
+  op.drop_index('squad_users_by_user_id', 'squad_users')
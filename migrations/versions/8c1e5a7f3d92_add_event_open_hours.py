@@ -0,0 +1,34 @@
+"""add event open hours bitmask
+
+Revision ID: 8c1e5a7f3d92
+Revises: 2b6f4e8d1c35
+Create Date: 2026-10-19 19:06:15.482906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import BIT
+
+# revision identifiers, used by Alembic.
+revision = '8c1e5a7f3d92'
+down_revision = '2b6f4e8d1c35'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.add_column('events', sa.Column('open_hours', BIT(168)))
+
+  op.drop_index('event_open_intervals_by_open_minute_and_close_minute', 'event_open_intervals')
+  op.drop_table('event_open_intervals')
+
+def downgrade():
+  op.create_table(
+    'event_open_intervals',
+    sa.Column('event_id', sa.Integer, ForeignKey('events.event_id'), primary_key=True),
+    sa.Column('open_minute', sa.Integer, primary_key=True),
+    sa.Column('close_minute', sa.Integer, nullable=False)
+  )
+  op.create_index('event_open_intervals_by_open_minute_and_close_minute', 'event_open_intervals', ['open_minute', 'close_minute'])
+
+  op.drop_column('events', 'open_hours')
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""create user suggestions
+
+Revision ID: 9b4d2e7c1a53
+Revises: 3c8e1f2a9d47
+Create Date: 2026-10-19 14:03:52.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import ForeignKey
+from sqlalchemy.sql import func
+
+# revision identifiers, used by Alembic.
+revision = '9b4d2e7c1a53'
+down_revision = '3c8e1f2a9d47'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    'user_suggestions',
+    sa.Column('user_id', sa.Integer, ForeignKey('users.user_id'), primary_key=True),
+    sa.Column('suggest_id', sa.Integer, ForeignKey('users.user_id'), primary_key=True),
+    sa.Column('rank', sa.Integer, nullable=False),
+    sa.Column('score', sa.Float, nullable=False, server_default='0'),
+    sa.Column('mutual_count', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('shared_event_count', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=func.now())
+  )
+  op.create_index('user_suggestions_by_user_id_and_rank', 'user_suggestions', ['user_id', 'rank'])
+
+def downgrade():
+  op.drop_index('user_suggestions_by_user_id_and_rank', 'user_suggestions')
+  op.drop_table('user_suggestions')
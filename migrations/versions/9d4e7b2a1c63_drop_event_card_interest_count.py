@@ -0,0 +1,21 @@
+"""drop event card interest count
+
+Revision ID: 9d4e7b2a1c63
+Revises: 6a3c9e1b5d84
+Create Date: 2026-10-19 21:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9d4e7b2a1c63'
+down_revision = '6a3c9e1b5d84'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.drop_column('event_cards', 'interest_count')
+
+def downgrade():
+  op.add_column('event_cards', sa.Column('interest_count', sa.Integer, nullable=False, server_default='0'))
\ No newline at end of file
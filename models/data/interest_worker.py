@@ -0,0 +1,95 @@
+import argparse
+import collections
+import time
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from models.base import db_session
+from models.event_ranker import EventRanker
+from models.interest_queue import InterestQueue
+from models.page_version import PageVersion
+from models.squad_feed import SquadFeed
+from models.user_counter import UserCounter
+from models.user_event import UserEvent
+
+class InterestWorker:
+  def apply(self, items):
+    # Last click wins for each (user, event)
+    latest = collections.OrderedDict()
+    for item in items:
+      latest[(item['user_id'], item['event_id'])] = item['interest']
+    if not latest: return latest
+
+    previous = {
+      (user_id, event_id): interest
+      for user_id, event_id, interest in db_session.query(
+        UserEvent.user_id,
+        UserEvent.event_id,
+        UserEvent.interest
+      ).filter(
+        tuple_(UserEvent.user_id, UserEvent.event_id).in_(list(latest.keys()))
+      )
+    }
+
+    stmt = insert(UserEvent.__table__).values([
+      {'user_id': user_id, 'event_id': event_id, 'interest': interest}
+      for (user_id, event_id), interest in latest.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+      index_elements=['event_id', 'user_id'],
+      set_={'interest': stmt.excluded.interest}
+    )
+    db_session.execute(stmt)
+
+    # Patch cached event counts by the change instead of recounting, see UserStats.live_event_count
+    def is_interested(interest):
+      return interest in UserEvent.INTERESTED_LEVELS
+
+    deltas = collections.Counter()
+    for key, interest in latest.items():
+      deltas[key[0]] += is_interested(interest)-is_interested(previous.get(key))
+    for user_id, delta in deltas.items():
+      if delta:
+        UserCounter.query.filter(
+          UserCounter.user_id == user_id
+        ).update({
+          UserCounter.event_count: UserCounter.event_count+delta,
+          UserCounter.updated_at: func.now()
+        }, synchronize_session=False)
+    db_session.commit()
+
+    event_ids_by_user_id = collections.defaultdict(list)
+    for user_id, event_id in latest:
+      event_ids_by_user_id[user_id].append(event_id)
+    for user_id, event_ids in event_ids_by_user_id.items():
+      EventRanker.invalidate_user(user_id)
+      SquadFeed.invalidate_user(user_id)
+      PageVersion.bump_interest(user_id, *event_ids)
+    return latest
+
+  def run(self, batch_size=500, interval=1.0, once=None):
+    worker_id = InterestQueue.new_worker_id()
+    while True:
+      items = InterestQueue.claim(batch_size, worker_id)
+      if items:
+        applied = self.apply(items)
+        InterestQueue.release(applied, worker_id)
+        print("Applied {} interest changes from {} clicks".format(len(applied), len(items)))
+      elif once:
+        InterestQueue.retire(worker_id)
+        break
+      else:
+        time.sleep(interval)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--batch_size', action="store", type=int, default=500)
+  parser.add_argument('--interval', action="store", type=float, default=1.0)
+  parser.add_argument('--once', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  e = InterestWorker()
+  e.run(**args)
@@ -0,0 +1,162 @@
+import argparse
+import datetime
+import random
+
+from sqlalchemy import or_
+
+from models.base import db_session
+from models.block import Block
+from models.event import Event
+from models.event_tag import EventTag
+from models.follow import Follow
+from models.social_graph import SocialGraph
+from models.tag import Tag
+from models.user import User
+from models.user_event import UserEvent
+
+class SeedSynthetic:
+  PREFIX = "synthetic"
+  DOMAIN = "synthetic.eventfinder"
+
+  CITIES = [
+    ("San Francisco", "CA", 37.7749, -122.4194),
+    ("Oakland", "CA", 37.8044, -122.2712),
+    ("Berkeley", "CA", 37.8716, -122.2727),
+    ("San Jose", "CA", 37.3382, -121.8863),
+    ("Palo Alto", "CA", 37.4419, -122.1430)
+  ]
+
+  TAGS = {
+    Tag.FOOD_DRINK: [
+      "bakery", "bar", "burgers", "chinese", "coffee", "dim sum", "french", "italian",
+      "japanese", "korean", "mexican", "pizza", "ramen", "sushi", "thai", "vietnamese"
+    ],
+    Tag.TVM: [
+      "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama",
+      "Family", "Fantasy", "Horror", "Mystery", "Romance", "Science Fiction", "Thriller"
+    ]
+  }
+
+  ACCOLADES = ["Michelin *", "Michelin Bib Gourmand", "SF Chronicle Top 100", "Mercury News Top 100"]
+
+  @classmethod
+  def synthetic_users(klass):
+    return User.query.filter(User.email.like("%@{}".format(klass.DOMAIN)))
+
+  @classmethod
+  def synthetic_events(klass):
+    return Event.query.filter(Event.alias.like("{}_%".format(klass.PREFIX)))
+
+  @classmethod
+  def purge(klass):
+    user_ids = [u.user_id for u in klass.synthetic_users()]
+    event_ids = [e.event_id for e in klass.synthetic_events()]
+
+    if user_ids:
+      Follow.query.filter(
+        or_(Follow.user_id.in_(user_ids), Follow.follow_id.in_(user_ids))
+      ).delete(synchronize_session=False)
+      Block.query.filter(
+        or_(Block.user_id.in_(user_ids), Block.block_id.in_(user_ids))
+      ).delete(synchronize_session=False)
+      UserEvent.query.filter(UserEvent.user_id.in_(user_ids)).delete(synchronize_session=False)
+    if event_ids:
+      UserEvent.query.filter(UserEvent.event_id.in_(event_ids)).delete(synchronize_session=False)
+      EventTag.query.filter(EventTag.event_id.in_(event_ids)).delete(synchronize_session=False)
+      Event.query.filter(Event.event_id.in_(event_ids)).delete(synchronize_session=False)
+    if user_ids:
+      User.query.filter(User.user_id.in_(user_ids)).delete(synchronize_session=False)
+    db_session.commit()
+    SocialGraph.invalidate()
+
+  @classmethod
+  def seed(
+    klass,
+    users=200, events=2000,
+    tags_per_event=3, interests_per_user=40, follows_per_user=20, blocks_per_user=1,
+    random_seed=0, purge=None
+  ):
+    rand = random.Random(random_seed)
+
+    if purge:
+      klass.purge()
+
+    tags_by_type = {
+      tag_type: [Tag.create_tag(tag_name, tag_type) for tag_name in tag_names]
+      for tag_type, tag_names in klass.TAGS.items()
+    }
+
+    now = datetime.datetime.now()
+    rows_event = []
+    for i in range(events):
+      event_type = rand.choice(list(tags_by_type.keys()))
+      city, state, lat, lon = rand.choice(klass.CITIES)
+      start_time = now+datetime.timedelta(days=rand.randint(-180, 180), hours=rand.randint(0, 23))
+      rows_event.append(Event(
+        alias = "{}_{}".format(klass.PREFIX, i),
+        name = "{} {} {}".format(klass.PREFIX.title(), event_type.title(), i),
+        primary_type = event_type,
+        img_url = "https://picsum.photos/seed/{}/348".format(i),
+        start_time = start_time,
+        end_time = start_time+datetime.timedelta(days=rand.randint(0, 180)),
+        address = "{} Synthetic St".format(rand.randint(1, 9999)),
+        city = city,
+        state = state,
+        latitude = round(lat+rand.uniform(-0.1, 0.1), 7),
+        longitude = round(lon+rand.uniform(-0.1, 0.1), 7),
+        accolades = sorted(rand.sample(klass.ACCOLADES, rand.randint(1, 2))) if rand.random() < 0.1 else None,
+        description = [["Synthetic", "Synthetic description {}".format(i)]]
+      ))
+    db_session.add_all(rows_event)
+    db_session.flush()
+
+    for ev in rows_event:
+      for row_tag in rand.sample(tags_by_type[ev.primary_type], tags_per_event):
+        db_session.add(EventTag(event_id=ev.event_id, tag_id=row_tag.tag_id))
+    db_session.commit()
+    print("Seeded {} events".format(len(rows_event)))
+
+    rows_user = [
+      User(
+        username = "{}_{}".format(klass.PREFIX, i),
+        email = "{}_{}@{}".format(klass.PREFIX, i, klass.DOMAIN),
+        display_name = "Synthetic User {}".format(i),
+        first_name = "Synthetic",
+        last_name = "User {}".format(i),
+        image_url = "https://picsum.photos/seed/user{}/64".format(i)
+      ) for i in range(users)
+    ]
+    db_session.add_all(rows_user)
+    db_session.flush()
+
+    # Skew interest towards popular events so aggregate counts look realistic
+    event_weights = [1.0/(i+1) for i in range(len(rows_event))]
+    interest_levels = list(range(0, 5))
+    for u in rows_user:
+      chosen = set(rand.choices(rows_event, weights=event_weights, k=interests_per_user))
+      for ev in chosen:
+        db_session.add(UserEvent(user_id=u.user_id, event_id=ev.event_id, interest=rand.choice(interest_levels)))
+
+      others = [x for x in rand.sample(rows_user, min(len(rows_user), follows_per_user+blocks_per_user+1)) if x is not u]
+      for f in others[:follows_per_user]:
+        db_session.add(Follow(user_id=u.user_id, follow_id=f.user_id, active=True))
+      for b in others[follows_per_user:follows_per_user+blocks_per_user]:
+        db_session.add(Block(user_id=u.user_id, block_id=b.user_id, active=True))
+    db_session.commit()
+    SocialGraph.invalidate()
+    print("Seeded {} users".format(len(rows_user)))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--users', action="store", type=int, default=200)
+  parser.add_argument('--events', action="store", type=int, default=2000)
+  parser.add_argument('--tags_per_event', action="store", type=int, default=3)
+  parser.add_argument('--interests_per_user', action="store", type=int, default=40)
+  parser.add_argument('--follows_per_user', action="store", type=int, default=20)
+  parser.add_argument('--blocks_per_user', action="store", type=int, default=1)
+  parser.add_argument('--random_seed', action="store", type=int, default=0)
+  parser.add_argument('--purge', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  SeedSynthetic.seed(**args)
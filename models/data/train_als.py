@@ -0,0 +1,136 @@
+import argparse
+import datetime
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from models.base import db_session
+from models.event_recommender import EventRecommender
+from models.user_event import UserEvent
+
+# Implicit-feedback ALS (Hu, Koren, Volinsky 2008) over user_events
+class TrainALS:
+  # interest level -> (preference, confidence)
+  # A skip is a confident "no", the other levels grow more confident with commitment
+  INTEREST_SIGNALS = {
+    0: (0.0, 1.0),
+    1: (1.0, 1.0),
+    2: (1.0, 2.0),
+    3: (1.0, 3.0),
+    4: (1.0, 3.0)
+  }
+
+  KEEP = 3
+
+  @classmethod
+  def matrices(klass, alpha):
+    rows = db_session.query(
+      UserEvent.user_id,
+      UserEvent.event_id,
+      UserEvent.interest
+    ).filter(
+      UserEvent.interest != None
+    ).all()
+    if not rows:
+      raise Exception("No user_events to train on")
+
+    user_ids, event_ids, interests = (np.array(x, dtype=np.int64) for x in zip(*rows))
+    unique_user_ids, user_idx = np.unique(user_ids, return_inverse=True)
+    unique_event_ids, event_idx = np.unique(event_ids, return_inverse=True)
+
+    signals = np.array([klass.INTEREST_SIGNALS[x] for x in range(max(klass.INTEREST_SIGNALS)+1)])
+    preferences = signals[interests, 0]
+    confidences = alpha*signals[interests, 1]
+
+    shape = (len(unique_user_ids), len(unique_event_ids))
+    # Preferences and confidences share one sparsity pattern, built once per orientation
+    def csr(row_idx, col_idx, n_rows, n_cols):
+      order = np.lexsort((col_idx, row_idx))
+      indptr = np.concatenate(([0], np.cumsum(np.bincount(row_idx, minlength=n_rows))))
+      return (
+        sp.csr_matrix((confidences[order], col_idx[order], indptr), shape=(n_rows, n_cols)),
+        preferences[order]
+      )
+
+    by_user = csr(user_idx, event_idx, *shape)
+    by_event = csr(event_idx, user_idx, shape[1], shape[0])
+    return unique_user_ids, unique_event_ids, by_user, by_event
+
+  @classmethod
+  def solve(klass, fixed, confidences, preferences, regularization):
+    factors = fixed.shape[1]
+    YtY = fixed.T @ fixed + regularization*np.eye(factors)
+
+    solved = np.zeros((confidences.shape[0], factors))
+    indptr, indices, data = confidences.indptr, confidences.indices, confidences.data
+    for i in range(confidences.shape[0]):
+      start, end = indptr[i], indptr[i+1]
+      if start == end: continue
+
+      Y = fixed[indices[start:end]]
+      c = data[start:end]
+      # (Y'Y + Y'(C-I)Y + lambda*I) x = Y'Cp
+      A = YtY + (Y.T*c) @ Y
+      b = Y.T @ ((c+1)*preferences[start:end])
+      solved[i] = np.linalg.solve(A, b)
+    return solved
+
+  @classmethod
+  def write(klass, path, user_ids, user_factors, event_ids, event_factors):
+    version = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    version_path = os.path.join(path, version)
+    os.makedirs(version_path, exist_ok=True)
+
+    np.save(os.path.join(version_path, EventRecommender.USER_IDS), user_ids)
+    np.save(os.path.join(version_path, EventRecommender.USER_FACTORS), user_factors.astype(np.float32))
+    np.save(os.path.join(version_path, EventRecommender.EVENT_IDS), event_ids)
+    np.save(os.path.join(version_path, EventRecommender.EVENT_FACTORS), event_factors.astype(np.float32))
+
+    # Swap the symlink atomically so readers never see a half-written set
+    current = os.path.join(path, EventRecommender.CURRENT)
+    tmp = current+".tmp"
+    if os.path.lexists(tmp): os.remove(tmp)
+    os.symlink(version, tmp)
+    os.replace(tmp, current)
+
+    # Older versions may still be mapped by running workers, keep a few
+    versions = sorted(x for x in os.listdir(path) if x.isdigit())
+    for old_version in versions[:-klass.KEEP]:
+      old_path = os.path.join(path, old_version)
+      for name in os.listdir(old_path):
+        os.remove(os.path.join(old_path, name))
+      os.rmdir(old_path)
+    return version_path
+
+  def train(self, factors=32, iterations=15, regularization=0.1, alpha=10.0, random_seed=0, path=None):
+    if path is None: path = EventRecommender.get_path()
+
+    user_ids, event_ids, by_user, by_event = self.matrices(alpha)
+    print("Training on {} users x {} events, {} interactions".format(len(user_ids), len(event_ids), by_user[0].nnz))
+
+    rand = np.random.RandomState(random_seed)
+    user_factors = rand.normal(scale=0.01, size=(len(user_ids), factors))
+    event_factors = rand.normal(scale=0.01, size=(len(event_ids), factors))
+
+    for i in range(iterations):
+      user_factors = self.solve(event_factors, by_user[0], by_user[1], regularization)
+      event_factors = self.solve(user_factors, by_event[0], by_event[1], regularization)
+      print("Iteration {} of {}".format(i+1, iterations))
+
+    version_path = self.write(path, user_ids, user_factors, event_ids, event_factors)
+    print("Wrote factors to {}".format(version_path))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--factors', action="store", type=int, default=32)
+  parser.add_argument('--iterations', action="store", type=int, default=15)
+  parser.add_argument('--regularization', action="store", type=float, default=0.1)
+  parser.add_argument('--alpha', action="store", type=float, default=10.0)
+  parser.add_argument('--random_seed', action="store", type=int, default=0)
+  parser.add_argument('--path', action="store")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  e = TrainALS()
+  e.train(**args)
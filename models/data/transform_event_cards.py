@@ -0,0 +1,23 @@
+import argparse
+
+from models.base import db_session
+from models.event_card import EventCard
+
+class TransformEventCards:
+  def transform(self, event_id=None, purge=None):
+    if purge:
+      EventCard.query.delete()
+      db_session.commit()
+
+    ct = EventCard.refresh([event_id] if event_id is not None else None)
+    print("Refreshed {} event cards".format(ct))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--event_id', action="store", type=int)
+  parser.add_argument('--purge', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  e = TransformEventCards()
+  e.transform(**args)
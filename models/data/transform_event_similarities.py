@@ -0,0 +1,122 @@
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.sql import func
+
+from models.base import db_session
+from models.event import Event
+from models.event_similarity import EventSimilarity
+from models.event_tag import EventTag
+from models.page_version import PageVersion
+from models.user_event import UserEvent
+
+class TransformEventSimilarities:
+  TAG_WEIGHT = 1.0
+  CO_INTEREST_WEIGHT = 2.0
+
+  BATCH_SIZE = 1000
+
+  @classmethod
+  def _normalize_rows(klass, m):
+    norms = np.sqrt(m.multiply(m).sum(axis=1)).A1
+    norms[norms == 0] = 1.0
+    return sp.diags(1.0/norms) @ m
+
+  @classmethod
+  def matrices(klass):
+    event_ids = np.array(
+      [x for x, in db_session.query(Event.event_id).order_by(Event.event_id)],
+      dtype=np.int64
+    )
+    n_events = len(event_ids)
+
+    def event_index(ids):
+      return np.searchsorted(event_ids, np.array(ids, dtype=np.int64))
+
+    # events x tags
+    rows = db_session.query(EventTag.event_id, EventTag.tag_id).all()
+    tag_event_ids, tag_ids = zip(*rows) if rows else ((), ())
+    unique_tag_ids, tag_idx = np.unique(np.array(tag_ids, dtype=np.int64), return_inverse=True)
+    tags = sp.csr_matrix(
+      (np.ones(len(tag_idx)), (event_index(tag_event_ids), tag_idx)),
+      shape=(n_events, len(unique_tag_ids))
+    )
+
+    # events x users, anything above skip counts as interest
+    rows = db_session.query(
+      UserEvent.event_id,
+      UserEvent.user_id
+    ).filter(
+      UserEvent.interest >= min(UserEvent.INTERESTED_LEVELS)
+    ).all()
+    interest_event_ids, user_ids = zip(*rows) if rows else ((), ())
+    unique_user_ids, user_idx = np.unique(np.array(user_ids, dtype=np.int64), return_inverse=True)
+    interests = sp.csr_matrix(
+      (np.ones(len(user_idx)), (event_index(interest_event_ids), user_idx)),
+      shape=(n_events, len(unique_user_ids))
+    )
+    interests.data[:] = 1.0
+
+    return event_ids, klass._normalize_rows(tags).tocsr(), klass._normalize_rows(interests).tocsr()
+
+  @classmethod
+  def top_n(klass, similarities, offset, top_n):
+    results = []
+    for i in range(similarities.shape[0]):
+      start, end = similarities.indptr[i], similarities.indptr[i+1]
+      cols = similarities.indices[start:end]
+      vals = similarities.data[start:end]
+
+      keep = (cols != offset+i) & (vals > 0)
+      cols, vals = cols[keep], vals[keep]
+      if len(vals) > top_n:
+        idx = np.argpartition(-vals, top_n)[:top_n]
+        cols, vals = cols[idx], vals[idx]
+      order = np.lexsort((cols, -vals))
+      results.append((cols[order], vals[order]))
+    return results
+
+  def transform(self, top_n=EventSimilarity.TOP_N, purge=None):
+    if purge:
+      EventSimilarity.query.delete()
+      db_session.commit()
+
+    event_ids, tags, interests = self.matrices()
+    tags_t = tags.T.tocsc()
+    interests_t = interests.T.tocsc()
+
+    now = func.now()
+    for offset in range(0, len(event_ids), self.BATCH_SIZE):
+      # Cosine similarity for a block of events against all events
+      similarities = (
+        self.TAG_WEIGHT*(tags[offset:offset+self.BATCH_SIZE] @ tags_t)
+        + self.CO_INTEREST_WEIGHT*(interests[offset:offset+self.BATCH_SIZE] @ interests_t)
+      ).tocsr()
+
+      batch_event_ids = event_ids[offset:offset+self.BATCH_SIZE].tolist()
+      EventSimilarity.query.filter(
+        EventSimilarity.event_id.in_(batch_event_ids)
+      ).delete(synchronize_session=False)
+
+      db_session.add_all([
+        EventSimilarity(
+          event_id = event_id,
+          similar_event_ids = event_ids[cols].tolist(),
+          scores = [round(float(x), 4) for x in vals],
+          updated_at = now
+        ) for event_id, (cols, vals) in zip(batch_event_ids, self.top_n(similarities, offset, top_n)) if len(cols)
+      ])
+      db_session.commit()
+      print("Computed similar events for {} of {} events".format(min(offset+self.BATCH_SIZE, len(event_ids)), len(event_ids)))
+    PageVersion.bump(PageVersion.EVENTS)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--top_n', action="store", type=int, default=EventSimilarity.TOP_N)
+  parser.add_argument('--purge', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  e = TransformEventSimilarities()
+  e.transform(**args)
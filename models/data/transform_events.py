@@ -3,11 +3,14 @@ import json
 import re
 
 from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
 
 from models.base import db_session
 from models.connector_event import ConnectorEvent
 from models.event import Event
+from models.event_card import EventCard
 from models.event_tag import EventTag
+from models.open_hours import OpenHours
 from models.tag import Tag
 from models.data.extract_events import ExtractEvents
 from models.data.extract_mmv import ExtractMMV
@@ -198,6 +201,11 @@ class TransformEvents:
     cost = get_from(ev_meta, [ConnectGoogle.TYPE, 'cost'])
     if cost: event.cost = len(cost)
 
+    event.open_hours = OpenHours.compile(
+      google_periods=get_from(ev_meta, [ConnectGoogle.TYPE, 'opening_hours', 'periods']),
+      yelp_hours=get_from(ev_meta, [ConnectYelp.TYPE, 'hours'])
+    )
+
     if not skip_write:
       db_session.merge(event)
       db_session.commit()
@@ -211,10 +219,13 @@ class TransformEvents:
     rating_delta=None, rating_gt=None, rating_lt=None,
     skip_write=None, verbose=None
   ):
-    events = Event.query.filter(Event.primary_type == Tag.FOOD_DRINK)
-
-    if name is not None: events = Event.query.filter(Event.name == name)
-    if event_id is not None: events = Event.query.filter(Event.event_id == event_id)
+    events = Event.query.options(joinedload(Event.payload))
+    if event_id is not None:
+      events = events.filter(Event.event_id == event_id)
+    elif name is not None:
+      events = events.filter(Event.name == name)
+    else:
+      events = events.filter(Event.primary_type == Tag.FOOD_DRINK)
     if no_img:
       events = events.filter(
         or_(
@@ -232,9 +243,11 @@ class TransformEvents:
     g_gt_counter = 0
     y_gt_counter = 0
     rating_d_counter = 0
+    transformed_event_ids = []
     for i, event in enumerate(events):
       total_counter += 1
       event = self.transform_event(event, skip_write)
+      if not skip_write: transformed_event_ids.append(event.event_id)
 
       g_rating = get_from(event.details, [ConnectGoogle.TYPE, Event.DETAILS_RATING]) or 0
       y_rating = get_from(event.details, [ConnectYelp.TYPE, Event.DETAILS_RATING]) or 0
@@ -276,6 +289,10 @@ class TransformEvents:
       # print(json.dumps(event.details, indent=2))
       print("\n")
 
+    # One card upsert, commit and page version bump per batch instead of per event
+    for i in range(0, len(transformed_event_ids), EventCard.BATCH_SIZE):
+      EventCard.refresh(transformed_event_ids[i:i+EventCard.BATCH_SIZE])
+
     if rating_delta:
       print("Rating Delta >={}: {} of {} ({}%)".format(
         rating_delta,
@@ -0,0 +1,24 @@
+import argparse
+
+from models.base import db_session
+from models.user_counter import UserCounter
+from models.user_stats import UserStats
+
+class TransformUserCounters:
+  def transform(self, user_id=None, purge=None):
+    if purge:
+      UserCounter.query.delete()
+      db_session.commit()
+
+    UserStats.refresh_counters([user_id] if user_id is not None else None)
+    print("Refreshed {} user counters".format(UserCounter.query.count()))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--user_id', action="store", type=int)
+  parser.add_argument('--purge', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  e = TransformUserCounters()
+  e.transform(**args)
@@ -0,0 +1,112 @@
+import argparse
+import collections
+import heapq
+import math
+
+from sqlalchemy.sql import func
+
+from models.base import db_session
+from models.social_graph import SocialGraph
+from models.user import User
+from models.user_event import UserEvent
+from models.user_suggestion import UserSuggestion
+
+class TransformUserSuggestions:
+  MUTUAL_WEIGHT = 1.0
+  SHARED_EVENT_WEIGHT = 0.5
+
+  BATCH_SIZE = 500
+
+  # Events someone has marked maybe/go/done, skips do not signal shared taste
+  @classmethod
+  def interest_sets(klass):
+    events_by_user = collections.defaultdict(set)
+    users_by_event = collections.defaultdict(list)
+    for user_id, event_id in db_session.query(
+      UserEvent.user_id,
+      UserEvent.event_id
+    ).filter(
+      UserEvent.interest >= min(UserEvent.INTERESTED_LEVELS)
+    ).yield_per(10000):
+      events_by_user[user_id].add(event_id)
+      users_by_event[event_id].append(user_id)
+    return events_by_user, users_by_event
+
+  @classmethod
+  def shared_events(klass, user_id, events_by_user, users_by_event):
+    # Popular events say little about shared taste, weight them down
+    shared = collections.Counter()
+    weighted = collections.Counter()
+    for event_id in events_by_user.get(user_id, ()):
+      other_ids = users_by_event[event_id]
+      weight = 1.0/math.log(1+len(other_ids))
+      for other_id in other_ids:
+        shared[other_id] += 1
+        weighted[other_id] += weight
+    return shared, weighted
+
+  @classmethod
+  def score(klass, user_id, graph, events_by_user, users_by_event, top_k=UserSuggestion.TOP_K):
+    mutual = graph.friends_of_friends(user_id)
+    shared, weighted = klass.shared_events(user_id, events_by_user, users_by_event)
+
+    excluded = graph.excluded_suggestion_ids(user_id)
+    candidates = (set(mutual) | set(shared)) - excluded
+
+    scores = {
+      candidate_id: klass.MUTUAL_WEIGHT*mutual[candidate_id]+klass.SHARED_EVENT_WEIGHT*weighted[candidate_id]
+      for candidate_id in candidates
+    }
+    top = heapq.nlargest(top_k, scores.items(), key=lambda x: (x[1], -x[0]))
+
+    return [
+      UserSuggestion(
+        user_id = user_id,
+        suggest_id = candidate_id,
+        rank = rank,
+        score = score,
+        mutual_count = mutual[candidate_id],
+        shared_event_count = shared[candidate_id]
+      ) for rank, (candidate_id, score) in enumerate(top)
+    ]
+
+  def transform(self, user_id=None, top_k=UserSuggestion.TOP_K, purge=None):
+    if purge:
+      UserSuggestion.query.delete()
+      db_session.commit()
+
+    graph = SocialGraph.get()
+    events_by_user, users_by_event = self.interest_sets()
+
+    if user_id is not None:
+      user_ids = [user_id]
+    else:
+      user_ids = [x for x, in db_session.query(User.user_id).order_by(User.user_id)]
+
+    now = func.now()
+    for i in range(0, len(user_ids), self.BATCH_SIZE):
+      batch_user_ids = user_ids[i:i+self.BATCH_SIZE]
+
+      UserSuggestion.query.filter(
+        UserSuggestion.user_id.in_(batch_user_ids)
+      ).delete(synchronize_session=False)
+
+      rows = []
+      for batch_user_id in batch_user_ids:
+        rows.extend(self.score(batch_user_id, graph, events_by_user, users_by_event, top_k=top_k))
+      for row in rows:
+        row.updated_at = now
+      db_session.add_all(rows)
+      db_session.commit()
+      print("Ranked suggestions for {} of {} users".format(min(i+self.BATCH_SIZE, len(user_ids)), len(user_ids)))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--user_id', action="store", type=int)
+  parser.add_argument('--top_k', action="store", type=int, default=UserSuggestion.TOP_K)
+  parser.add_argument('--purge', action="store_true")
+  group = parser.add_mutually_exclusive_group()
+  args = vars(parser.parse_args())
+
+  e = TransformUserSuggestions()
+  e.transform(**args)
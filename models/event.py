@@ -4,12 +4,15 @@ from sqlalchemy import and_
 from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, JSON
 from sqlalchemy import orm
 from sqlalchemy import String
+from sqlalchemy.dialects.postgresql import BIT
 from sqlalchemy.orm import relationship
 from sqlalchemy_json import NestedMutableJson
 
 from .base import Base
 from .base import db_session
+from .event_payload import EventPayload
 from .event_tag import EventTag
+from .open_hours import OpenHours
 from .tag import Tag
 from .user_event import UserEvent
 
@@ -27,7 +30,6 @@ class Event(Base):
   name = Column(String)
   primary_type = Column(String)
 
-  description = Column(JSON)
   short_name = Column(String)
 
   img_url = Column(String)
@@ -46,11 +48,13 @@ class Event(Base):
   latitude = Column(Float)
   longitude = Column(Float)
 
+  open_hours = Column(BIT(OpenHours.HOURS_PER_WEEK))
+
   urls = Column(NestedMutableJson)
 
   accolades = Column(NestedMutableJson)
-  details = Column(NestedMutableJson)
-  meta = Column(NestedMutableJson)
+
+  payload = relationship('EventPayload', uselist=False, cascade="all,delete-orphan")
 
   connector_events = relationship('ConnectorEvent', cascade="all,delete-orphan")
   tags = relationship('Tag', single_parent=True, secondary='event_tags', lazy='dynamic', cascade= "all,delete-orphan")
@@ -61,6 +65,32 @@ class Event(Base):
   def init_on_load(self):
     pass
 
+  def _get_payload(self):
+    if self.payload is None:
+      self.payload = EventPayload()
+    return self.payload
+
+  @property
+  def description(self):
+    return self.payload.description if self.payload else None
+  @description.setter
+  def description(self, value):
+    self._get_payload().description = value
+
+  @property
+  def details(self):
+    return self.payload.details if self.payload else None
+  @details.setter
+  def details(self, value):
+    self._get_payload().details = value
+
+  @property
+  def meta(self):
+    return self.payload.meta if self.payload else None
+  @meta.setter
+  def meta(self, value):
+    self._get_payload().meta = value
+
   def update_meta(self, meta_type, meta_data):
     if self.meta is None: self.meta = {}
     self.meta[meta_type] = meta_data
@@ -220,4 +250,11 @@ class Event(Base):
     return self._card_event_users
   @card_event_users.setter
   def card_event_users(self, value):
-    self._card_event_users = value
\ No newline at end of file
+    self._card_event_users = value
+
+  @property
+  def card_similar_events(self):
+    return self._card_similar_events
+  @card_similar_events.setter
+  def card_similar_events(self, value):
+    self._card_similar_events = value
\ No newline at end of file
@@ -0,0 +1,138 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import distinct
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import load_only, relationship
+from sqlalchemy.sql import func
+
+from .base import Base
+from .base import db_session
+from .event import Event
+from .event_tag import EventTag
+from .page_version import PageVersion
+from .tag import Tag
+
+# Slim projection of Event with just what a feed card renders, kept up to date by the ETL
+# Cards quack like Event in templates/events/_event_card.html
+class EventCard(Base):
+  BATCH_SIZE = 500
+
+  __tablename__ = 'event_cards'
+  event_id = Column(Integer, ForeignKey('events.event_id', ondelete='CASCADE'), primary_key=True)
+  display_name = Column(String)
+  img_url = Column(String)
+  display_address = Column(String)
+  accolades = Column(ARRAY(String))
+  categories = Column(ARRAY(String))
+  tags = Column(ARRAY(String))
+  updated_at = Column(DateTime)
+
+  event = relationship('Event', uselist=False)
+
+  def chip_names(self):
+    return self.category_names() | self.tag_names()
+
+  def category_names(self):
+    return set(self.categories or [])
+
+  def tag_names(self):
+    return set(self.tags or [])
+
+  @property
+  def current_user_event(self):
+    return self._current_user_event
+  @current_user_event.setter
+  def current_user_event(self, value):
+    self._current_user_event = value
+
+  @property
+  def card_user_count(self):
+    return self._card_user_count
+  @card_user_count.setter
+  def card_user_count(self, value):
+    self._card_user_count = value
+
+  @property
+  def card_event_users(self):
+    return self._card_event_users
+  @card_event_users.setter
+  def card_event_users(self, value):
+    self._card_event_users = value
+
+  # event_id -> card, events without a card yet fall back to their full Event row
+  @classmethod
+  def get_cards(klass, event_ids):
+    cards = {c.event_id: c for c in klass.query.filter(klass.event_id.in_(event_ids))}
+
+    missing_event_ids = [x for x in event_ids if x not in cards]
+    if missing_event_ids:
+      cards.update({e.event_id: e for e in Event.query.filter(Event.event_id.in_(missing_event_ids))})
+    return cards
+
+  @classmethod
+  def refresh(klass, event_ids=None):
+    events = db_session.query(Event).options(
+      load_only(
+        Event.event_id,
+        Event.name,
+        Event.img_url,
+        Event.address,
+        Event.city,
+        Event.state,
+        Event.accolades
+      )
+    ).order_by(
+      Event.event_id
+    )
+
+    tags = db_session.query(
+      EventTag.event_id,
+      func.array_agg(distinct(Tag.tag_type)),
+      func.array_agg(distinct(Tag.tag_name))
+    ).join(
+      Tag,
+      Tag.tag_id == EventTag.tag_id
+    ).group_by(
+      EventTag.event_id
+    )
+
+    if event_ids is not None:
+      events = events.filter(Event.event_id.in_(event_ids))
+      tags = tags.filter(EventTag.event_id.in_(event_ids))
+
+    tags_by_event_id = {event_id: (categories, tag_names) for event_id, categories, tag_names in tags}
+
+    def upsert(rows):
+      stmt = insert(klass.__table__).values(rows)
+      stmt = stmt.on_conflict_do_update(
+        index_elements=['event_id'],
+        set_={
+          col: getattr(stmt.excluded, col) for col in rows[0] if col != 'event_id'
+        }
+      )
+      db_session.execute(stmt)
+
+    rows = []
+    ct = 0
+    for event in events.yield_per(klass.BATCH_SIZE):
+      categories, tag_names = tags_by_event_id.get(event.event_id, ([], []))
+      rows.append({
+        'event_id': event.event_id,
+        'display_name': event.display_name,
+        'img_url': event.img_url,
+        'display_address': event.display_address,
+        'accolades': list(event.accolades) if event.accolades else None,
+        'categories': [x for x in categories if x],
+        'tags': [x for x in tag_names if x],
+        'updated_at': func.now()
+      })
+      if len(rows) >= klass.BATCH_SIZE:
+        upsert(rows)
+        ct += len(rows)
+        rows = []
+    if rows:
+      upsert(rows)
+      ct += len(rows)
+
+    db_session.commit()
+    PageVersion.bump(PageVersion.EVENTS)
+    return ct
\ No newline at end of file
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, ForeignKey, Integer, JSON
+from sqlalchemy_json import NestedMutableJson
+
+from .base import Base
+
+# Heavy per-event JSON kept off the events table, so feed queries never read it
+# Loaded lazily through Event.payload, or up front with joinedload(Event.payload) on the event page
+class EventPayload(Base):
+  __tablename__ = 'event_payloads'
+  event_id = Column(Integer, ForeignKey('events.event_id', ondelete='CASCADE'), primary_key=True)
+
+  description = Column(JSON)
+  details = Column(NestedMutableJson)
+  meta = Column(NestedMutableJson)
\ No newline at end of file
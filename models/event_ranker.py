@@ -0,0 +1,245 @@
+import hashlib
+import json
+
+import numpy as np
+import redis
+from sqlalchemy import alias, desc, nullslast
+from sqlalchemy.sql import func
+
+from helpers.redis_helper import get_redis
+
+from .base import db_session
+from .event_recommender import EventRecommender
+from .event_tag import EventTag
+from .social_graph import SocialGraph
+from .user_event import UserEvent
+
+# Feed orderings for explore, selected with ?feed=
+# Rankers take the filtered events query and return an ordered list of event ids
+class EventRanker:
+  POPULAR = "popular"
+  FOR_YOU = "foryou"
+
+  DEFAULT = POPULAR
+
+  _rankers = {}
+
+  @classmethod
+  def register(klass, ranker_klass):
+    klass._rankers[ranker_klass.MODE] = ranker_klass
+    return ranker_klass
+
+  @classmethod
+  def modes(klass):
+    return list(klass._rankers.keys())
+
+  @classmethod
+  def get(klass, mode=None):
+    ranker_klass = klass._rankers.get(mode) or klass._rankers[klass.DEFAULT]
+    return ranker_klass()
+
+  @classmethod
+  def invalidate_user(klass, user_id):
+    for ranker_klass in klass._rankers.values():
+      ranker_klass.invalidate(user_id)
+
+  # Popular ranking stays in SQL, see EventController._order_events
+  is_sql = True
+
+  @classmethod
+  def invalidate(klass, user_id):
+    pass
+
+  # (event_id, ct, has accolades) in the order EventController._order_events sorts events
+  @classmethod
+  def popular(klass, events):
+    events_table = alias(events, 'events_table')
+    return db_session.query(
+      events_table.c.events_event_id,
+      events_table.c.ct,
+      events_table.c.events_accolades != None
+    ).order_by(
+      nullslast(desc(events_table.c.ct)),
+      nullslast(events_table.c.events_end_time.desc()),
+      nullslast(events_table.c.events_event_id.asc())
+    )
+
+  # Ranked event ids, SQL rankers are normally ordered and paged in the query instead
+  def rank(self, events, user=None, cache_key=None):
+    return [row[0] for row in self.popular(events)]
+
+@EventRanker.register
+class PopularRanker(EventRanker):
+  MODE = EventRanker.POPULAR
+
+@EventRanker.register
+class PersonalizedRanker(EventRanker):
+  MODE = EventRanker.FOR_YOU
+
+  is_sql = False
+
+  CANDIDATES = 500
+  TTL = 300
+  CACHE_KEY = "event_ranker:{}:{}"
+
+  W_POPULAR = 1.0
+  W_TAG = 2.0
+  W_FOLLOWING = 1.5
+  W_ACCOLADES = 0.5
+  W_COLLABORATIVE = 1.0
+
+  # How much an interest level says about liking the event's tags
+  INTEREST_WEIGHTS = np.array([-1.0, 1.0, 2.0, 2.0, 2.0])
+
+  @classmethod
+  def cache_key(klass, user_id):
+    return klass.CACHE_KEY.format(klass.MODE, user_id)
+
+  @classmethod
+  def filter_key(klass, **filters):
+    dump = json.dumps(
+      {k: sorted(v) if isinstance(v, (set, list)) else v for k, v in filters.items()},
+      sort_keys=True
+    )
+    return hashlib.md5(dump.encode()).hexdigest()
+
+  @classmethod
+  def invalidate(klass, user_id):
+    try:
+      get_redis().delete(klass.cache_key(user_id))
+    except redis.RedisError:
+      pass
+
+  @classmethod
+  def _get_cached(klass, user_id, filter_key):
+    try:
+      cached = get_redis().hget(klass.cache_key(user_id), filter_key)
+    except redis.RedisError:
+      return None
+    if cached is None: return None
+    return json.loads(cached)
+
+  @classmethod
+  def _set_cached(klass, user_id, filter_key, event_ids):
+    try:
+      r = get_redis()
+      key = klass.cache_key(user_id)
+      pipe = r.pipeline()
+      pipe.hset(key, filter_key, json.dumps(event_ids))
+      pipe.expire(key, klass.TTL)
+      pipe.execute()
+    except redis.RedisError:
+      pass
+
+  @classmethod
+  def candidates(klass, events):
+    candidates = klass.popular(events).limit(
+      klass.CANDIDATES
+    ).all()
+
+    if not candidates:
+      return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=bool)
+    event_ids, cts, has_accolades = zip(*candidates)
+    return (
+      np.array(event_ids, dtype=np.int64),
+      np.array([ct or 0 for ct in cts], dtype=np.float64),
+      np.array([bool(x) for x in has_accolades], dtype=bool)
+    )
+
+  @classmethod
+  def tag_affinities(klass, user_id):
+    rows = db_session.query(
+      EventTag.tag_id,
+      UserEvent.interest
+    ).join(
+      UserEvent,
+      UserEvent.event_id == EventTag.event_id
+    ).filter(
+      UserEvent.user_id == user_id,
+      UserEvent.interest != None
+    ).all()
+    if not rows: return {}
+
+    tag_ids, interests = (np.array(x, dtype=np.int64) for x in zip(*rows))
+    unique_tag_ids, tag_idx = np.unique(tag_ids, return_inverse=True)
+    weights = np.bincount(tag_idx, weights=klass.INTEREST_WEIGHTS[interests])
+    scale = np.abs(weights).max() or 1.0
+    return dict(zip(unique_tag_ids.tolist(), (weights/scale).tolist()))
+
+  @classmethod
+  def tag_scores(klass, event_ids, affinities):
+    if not affinities or not len(event_ids): return np.zeros(len(event_ids))
+
+    rows = db_session.query(
+      EventTag.event_id,
+      EventTag.tag_id
+    ).filter(
+      EventTag.event_id.in_(event_ids.tolist()),
+      EventTag.tag_id.in_(list(affinities.keys()))
+    ).all()
+    if not rows: return np.zeros(len(event_ids))
+
+    row_event_ids, row_tag_ids = (np.array(x, dtype=np.int64) for x in zip(*rows))
+    order = np.argsort(event_ids)
+    event_idx = order[np.searchsorted(event_ids, row_event_ids, sorter=order)]
+    tag_weights = np.array([affinities[x] for x in row_tag_ids.tolist()])
+    return np.bincount(event_idx, weights=tag_weights, minlength=len(event_ids))
+
+  @classmethod
+  def following_scores(klass, event_ids, user_id):
+    following_ids = SocialGraph.get().following_ids(user_id)
+    if not following_ids or not len(event_ids): return np.zeros(len(event_ids))
+
+    rows = db_session.query(
+      UserEvent.event_id,
+      func.count(UserEvent.user_id)
+    ).filter(
+      UserEvent.event_id.in_(event_ids.tolist()),
+      UserEvent.user_id.in_(following_ids),
+      UserEvent.interest.in_(UserEvent.INTERESTED_LEVELS | UserEvent.DONE_LEVELS)
+    ).group_by(
+      UserEvent.event_id
+    ).all()
+    if not rows: return np.zeros(len(event_ids))
+
+    row_event_ids, cts = (np.array(x, dtype=np.int64) for x in zip(*rows))
+    order = np.argsort(event_ids)
+    event_idx = order[np.searchsorted(event_ids, row_event_ids, sorter=order)]
+    return np.bincount(event_idx, weights=cts, minlength=len(event_ids))
+
+  @classmethod
+  def score(klass, user_id, event_ids, cts, has_accolades):
+    popular = np.log1p(cts)
+    if popular.size and popular.max() > 0:
+      popular = popular/popular.max()
+
+    tags = klass.tag_scores(event_ids, klass.tag_affinities(user_id))
+    following = np.log1p(klass.following_scores(event_ids, user_id))
+
+    # Zero until models.data.train_als has written factors
+    collaborative = EventRecommender.get().score(user_id, event_ids)
+    if collaborative.size and np.abs(collaborative).max() > 0:
+      collaborative = collaborative/np.abs(collaborative).max()
+
+    return (
+      klass.W_POPULAR*popular
+      + klass.W_TAG*tags
+      + klass.W_FOLLOWING*following
+      + klass.W_ACCOLADES*has_accolades
+      + klass.W_COLLABORATIVE*collaborative
+    )
+
+  # The feed is bounded to the top CANDIDATES events by popularity
+  def rank(self, events, user, cache_key=None):
+    if cache_key is not None:
+      cached = self._get_cached(user.user_id, cache_key)
+      if cached is not None: return cached
+
+    event_ids, cts, has_accolades = self.candidates(events)
+    scores = self.score(user.user_id, event_ids, cts, has_accolades)
+    # Candidates arrive in popularity order, a stable sort keeps it as the tiebreaker
+    ranked = event_ids[np.argsort(-scores, kind='stable')].tolist()
+
+    if cache_key is not None:
+      self._set_cached(user.user_id, cache_key, ranked)
+    return ranked
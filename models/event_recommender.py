@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# Collaborative-filtering factors written by models.data.train_als
+# Files are memory-mapped, so every worker shares the same pages
+class EventRecommender:
+  TTL = 60
+
+  CURRENT = "current"
+  USER_IDS = "user_ids.npy"
+  USER_FACTORS = "user_factors.npy"
+  EVENT_IDS = "event_ids.npy"
+  EVENT_FACTORS = "event_factors.npy"
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.path = None
+    self.checked_at = None
+    self.user_ids = None
+    self.user_factors = None
+    self.event_ids = None
+    self.event_factors = None
+
+  @classmethod
+  def get_path(klass):
+    return os.getenv('RECOMMENDER_PATH', 'data/recommender')
+
+  @classmethod
+  def get(klass):
+    with klass._instance_lock:
+      if klass._instance is None:
+        klass._instance = klass()
+      recommender = klass._instance
+    recommender.refresh()
+    return recommender
+
+  @property
+  def is_loaded(self):
+    return self.user_factors is not None
+
+  def refresh(self):
+    if self.checked_at is not None and time.time()-self.checked_at < self.TTL: return
+
+    with self.lock:
+      self.checked_at = time.time()
+      current = os.path.join(self.get_path(), self.CURRENT)
+      if not os.path.exists(current): return
+
+      path = os.path.realpath(current)
+      if path != self.path:
+        self.load(path)
+
+  def load(self, path):
+    def mmap(name):
+      return np.load(os.path.join(path, name), mmap_mode='r')
+
+    self.user_ids = mmap(self.USER_IDS)
+    self.user_factors = mmap(self.USER_FACTORS)
+    self.event_ids = mmap(self.EVENT_IDS)
+    self.event_factors = mmap(self.EVENT_FACTORS)
+    self.path = path
+
+  @classmethod
+  def _index(klass, ids, x):
+    idx = np.searchsorted(ids, x)
+    idx = np.minimum(idx, len(ids)-1)
+    return idx, ids[idx] == x
+
+  def score(self, user_id, event_ids):
+    scores = np.zeros(len(event_ids))
+    if not self.is_loaded or not len(event_ids): return scores
+
+    user_idx, user_found = self._index(self.user_ids, user_id)
+    if not user_found: return scores
+
+    event_idx, event_found = self._index(self.event_ids, np.asarray(event_ids, dtype=np.int64))
+    scores[event_found] = self.event_factors[event_idx[event_found]] @ self.user_factors[user_idx]
+    return scores
@@ -0,0 +1,52 @@
+import array
+import threading
+import time
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import relationship
+
+from .base import Base
+from .base import db_session
+
+class EventSimilarity(Base):
+  TOP_N = 12
+  TTL = 3600
+
+  __tablename__ = 'event_similarities'
+  event_id = Column(Integer, ForeignKey('events.event_id'), primary_key=True)
+  similar_event_ids = Column(ARRAY(Integer), nullable=False)
+  scores = Column(ARRAY(Float), nullable=False)
+  updated_at = Column(DateTime)
+
+  event = relationship('Event', uselist=False)
+
+  _similar = {}
+  _loaded_at = None
+  _lock = threading.Lock()
+
+  # Whole table lives in memory as event_id -> array('i'), reloaded after TTL
+  @classmethod
+  def _load(klass):
+    similar = {
+      event_id: array.array('i', similar_event_ids)
+      for event_id, similar_event_ids in db_session.query(
+        klass.event_id,
+        klass.similar_event_ids
+      ).yield_per(10000)
+    }
+    klass._similar = similar
+    klass._loaded_at = time.time()
+
+  @classmethod
+  def preload(klass):
+    with klass._lock:
+      klass._load()
+
+  @classmethod
+  def similar_ids(klass, event_id, limit=None):
+    with klass._lock:
+      if klass._loaded_at is None or time.time()-klass._loaded_at > klass.TTL:
+        klass._load()
+    similar_ids = klass._similar.get(event_id, ())
+    return list(similar_ids[:limit] if limit else similar_ids)
@@ -0,0 +1,159 @@
+import json
+import os
+import socket
+import uuid
+
+import redis
+
+from helpers.redis_helper import get_redis
+
+# Write-behind for interest clicks, enabled with INTEREST_WRITE_BEHIND=true
+# Clicks are queued in redis and applied in batches by models.data.interest_worker.
+# Until then the user's own pending interest is kept in a per-user hash so reads see it.
+class InterestQueue:
+  QUEUE_KEY = "interest_queue"
+  # Each worker claims into its own list, held under a lease it renews every claim
+  PROCESSING_KEY = "interest_queue:processing:{}"
+  LEASE_KEY = "interest_queue:lease:{}"
+  WORKERS_KEY = "interest_queue:workers"
+  LEASE_TTL = 60
+  PENDING_KEY = "interest_queue:pending:{}"
+  PENDING_TTL = 86400
+
+  NONE = ""
+
+  # Moves up to ARGV[1] items from the queue to the processing list
+  CLAIM_SCRIPT = """
+    local items = redis.call('lrange', KEYS[1], 0, tonumber(ARGV[1])-1)
+    if #items > 0 then
+      redis.call('ltrim', KEYS[1], #items, -1)
+      redis.call('rpush', KEYS[2], unpack(items))
+    end
+    return items
+  """
+
+  # Takes over the batch of a worker whose lease ran out, unless it came back
+  RECOVER_SCRIPT = """
+    if redis.call('exists', KEYS[3]) == 1 then return 0 end
+    local items = redis.call('lrange', KEYS[1], 0, -1)
+    if #items > 0 then
+      redis.call('rpush', KEYS[2], unpack(items))
+    end
+    redis.call('del', KEYS[1])
+    redis.call('srem', KEYS[4], ARGV[1])
+    return #items
+  """
+
+  # Clears a pending interest only if no newer click replaced it
+  RELEASE_SCRIPT = """
+    if redis.call('hget', KEYS[1], ARGV[1]) == ARGV[2] then
+      return redis.call('hdel', KEYS[1], ARGV[1])
+    end
+    return 0
+  """
+
+  @classmethod
+  def is_enabled(klass):
+    return os.getenv('INTEREST_WRITE_BEHIND', 'false').lower() == 'true'
+
+  @classmethod
+  def _pending_key(klass, user_id):
+    return klass.PENDING_KEY.format(user_id)
+
+  @classmethod
+  def _dump_interest(klass, interest):
+    return klass.NONE if interest is None else str(interest)
+
+  @classmethod
+  def _load_interest(klass, value):
+    if isinstance(value, bytes): value = value.decode()
+    return None if value == klass.NONE else int(value)
+
+  @classmethod
+  def enqueue(klass, user_id, event_id, interest):
+    item = json.dumps({'user_id': user_id, 'event_id': event_id, 'interest': interest})
+    pending_key = klass._pending_key(user_id)
+    try:
+      pipe = get_redis().pipeline()
+      pipe.hset(pending_key, event_id, klass._dump_interest(interest))
+      pipe.expire(pending_key, klass.PENDING_TTL)
+      pipe.rpush(klass.QUEUE_KEY, item)
+      pipe.execute()
+    except redis.RedisError:
+      return False
+    return True
+
+  # Returns (found, interest) for a click not yet applied to the db
+  @classmethod
+  def pending(klass, user_id, event_id):
+    try:
+      value = get_redis().hget(klass._pending_key(user_id), event_id)
+    except redis.RedisError:
+      return False, None
+    if value is None: return False, None
+    return True, klass._load_interest(value)
+
+  @classmethod
+  def _processing_key(klass, worker_id):
+    return klass.PROCESSING_KEY.format(worker_id)
+
+  @classmethod
+  def _lease_key(klass, worker_id):
+    return klass.LEASE_KEY.format(worker_id)
+
+  @classmethod
+  def new_worker_id(klass):
+    return "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+  @classmethod
+  def _recover(klass, r, worker_id):
+    recover = r.register_script(klass.RECOVER_SCRIPT)
+    for other_id in r.smembers(klass.WORKERS_KEY):
+      other_id = other_id.decode()
+      if other_id == worker_id: continue
+      recover(
+        keys=[
+          klass._processing_key(other_id),
+          klass._processing_key(worker_id),
+          klass._lease_key(other_id),
+          klass.WORKERS_KEY
+        ],
+        args=[other_id]
+      )
+
+  # The lease must outlive applying a batch, LEASE_TTL is well over a batch of a few hundred clicks
+  @classmethod
+  def claim(klass, batch_size, worker_id):
+    r = get_redis()
+    r.set(klass._lease_key(worker_id), 1, ex=klass.LEASE_TTL)
+    r.sadd(klass.WORKERS_KEY, worker_id)
+    klass._recover(r, worker_id)
+
+    processing_key = klass._processing_key(worker_id)
+    # Left from a batch this worker failed to apply, or taken over from a dead one
+    items = r.lrange(processing_key, 0, -1)
+    if not items:
+      items = r.register_script(klass.CLAIM_SCRIPT)(
+        keys=[klass.QUEUE_KEY, processing_key],
+        args=[batch_size]
+      )
+    return [json.loads(x) for x in items]
+
+  @classmethod
+  def release(klass, applied, worker_id):
+    r = get_redis()
+    release = r.register_script(klass.RELEASE_SCRIPT)
+    for (user_id, event_id), interest in applied.items():
+      release(keys=[klass._pending_key(user_id)], args=[event_id, klass._dump_interest(interest)])
+    r.delete(klass._processing_key(worker_id))
+
+  # A worker stopping cleanly, with nothing left in its processing list
+  @classmethod
+  def retire(klass, worker_id):
+    r = get_redis()
+    r.srem(klass.WORKERS_KEY, worker_id)
+    r.delete(klass._lease_key(worker_id))
+
+  @classmethod
+  def size(klass):
+    return get_redis().llen(klass.QUEUE_KEY)
@@ -0,0 +1,84 @@
+import datetime
+
+from dateutil import tz
+
+from utils.get_from import get_from
+
+# Weekly opening hours compiled into a bitmask of the 168 hours of the week, stored as BIT(168)
+# Bit 0 is Sunday 00:00-01:00 local time, matching Google's day numbering.
+# An hour is set if the place is open for any part of it.
+class OpenHours:
+  HOURS_PER_WEEK = 7*24
+  MINUTES_PER_DAY = 24*60
+  MINUTES_PER_WEEK = 7*MINUTES_PER_DAY
+
+  LOCAL_TIMEZONE = 'America/Los_Angeles'
+
+  @classmethod
+  def local_now(klass):
+    return datetime.datetime.now(tz.gettz(klass.LOCAL_TIMEZONE))
+
+  @classmethod
+  def hour_of_week(klass, dt):
+    return ((dt.weekday()+1)%7)*24 + dt.hour
+
+  @classmethod
+  def mask(klass, hours):
+    bits = ['0']*klass.HOURS_PER_WEEK
+    for hour in hours:
+      bits[hour%klass.HOURS_PER_WEEK] = '1'
+    return "".join(bits)
+
+  @classmethod
+  def _minute(klass, day, time):
+    return day*klass.MINUTES_PER_DAY + int(time[:2])*60 + int(time[2:])
+
+  @classmethod
+  def _google_intervals(klass, periods):
+    for period in periods or []:
+      open_day = get_from(period, ['open', 'day'])
+      open_time = get_from(period, ['open', 'time'])
+      if open_day is None or not open_time: continue
+      open_minute = klass._minute(int(open_day), open_time)
+
+      close_day = get_from(period, ['close', 'day'])
+      close_time = get_from(period, ['close', 'time'])
+      # Open with no close is Google's way of saying always open
+      if close_day is None or not close_time:
+        yield 0, klass.MINUTES_PER_WEEK
+        continue
+
+      close_minute = klass._minute(int(close_day), close_time)
+      if close_minute <= open_minute: close_minute += klass.MINUTES_PER_WEEK
+      yield open_minute, close_minute
+
+  @classmethod
+  def _yelp_intervals(klass, hours):
+    for hour in get_from(hours, [0, 'open'], []):
+      day = get_from(hour, ['day'])
+      start = get_from(hour, ['start'])
+      end = get_from(hour, ['end'])
+      if day is None or not start or not end: continue
+
+      # Yelp counts days from Monday
+      day = (int(day)+1)%7
+      open_minute = klass._minute(day, start)
+      close_minute = klass._minute(day, end)
+      if get_from(hour, ['is_overnight']) or close_minute <= open_minute:
+        close_minute += klass.MINUTES_PER_DAY
+      yield open_minute, close_minute
+
+  @classmethod
+  def _compile(klass, intervals):
+    hours = set()
+    for open_minute, close_minute in intervals:
+      hours.update(range(open_minute//60, (close_minute+59)//60))
+    return klass.mask(hours) if hours else None
+
+  # Google opening_hours.periods, falling back to Yelp hours, or None if neither is known
+  @classmethod
+  def compile(klass, google_periods=None, yelp_hours=None):
+    return (
+      klass._compile(klass._google_intervals(google_periods)) or
+      klass._compile(klass._yelp_intervals(yelp_hours))
+    )
\ No newline at end of file
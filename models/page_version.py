@@ -0,0 +1,53 @@
+import redis
+
+from helpers.redis_helper import get_redis
+
+# Redis counters bumped whenever what a page shows changes, so ETags can be checked
+# without touching Postgres, see helpers/http_cache_helper.py
+class PageVersion:
+  CACHE_KEY = "page_version:{}"
+
+  # Any event content, bumped by the ETL
+  EVENTS = "events"
+  # Any interest, which moves the counts on every feed
+  INTERESTS = "interests"
+
+  @classmethod
+  def cache_key(klass, name):
+    return klass.CACHE_KEY.format(name)
+
+  @classmethod
+  def event(klass, event_id):
+    return "event:{}".format(event_id)
+
+  @classmethod
+  def user(klass, user_id):
+    return "user:{}".format(user_id)
+
+  # Current versions in order, None if they can't be read
+  @classmethod
+  def get(klass, *names):
+    try:
+      versions = get_redis().mget([klass.cache_key(x) for x in names])
+    except redis.RedisError:
+      return None
+    return [int(x) if x else 0 for x in versions]
+
+  @classmethod
+  def bump(klass, *names):
+    if not names: return
+    try:
+      pipe = get_redis().pipeline(transaction=False)
+      for name in names:
+        pipe.incr(klass.cache_key(name))
+      pipe.execute()
+    except redis.RedisError:
+      pass
+
+  @classmethod
+  def bump_interest(klass, user_id, *event_ids):
+    klass.bump(
+      klass.INTERESTS,
+      klass.user(user_id),
+      *[klass.event(x) for x in event_ids]
+    )
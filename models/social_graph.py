@@ -0,0 +1,281 @@
+import array
+import bisect
+import collections
+import threading
+import time
+
+import redis
+
+from helpers.redis_helper import get_redis
+from helpers.replica_helper import read_primary
+
+from .base import db_session
+from .block import Block
+from .follow import Follow
+
+# In-process adjacency lists for follows and blocks.
+# Each user maps to a sorted array('i') of user ids, kept fresh by write-through
+# from UserController. Other workers replay those writes from a redis change log,
+# and reload everything only when a sync bumps the redis version.
+class SocialGraph:
+  TTL = 300
+  # Seconds between checks of the redis state, get() is called several times a request
+  CHECK_INTERVAL = 1
+  VERSION_KEY = "social_graph:version"
+  SEQ_KEY = "social_graph:seq"
+  CHANGES_KEY = "social_graph:changes"
+  # Changes kept for workers to catch up on, one further behind reloads
+  CHANGES_SIZE = 10000
+
+  FOLLOW = "f"
+  BLOCK = "b"
+
+  # Appends "<seq> <kind> <user_id> <other_id> <active>" and returns its seq
+  APPEND_SCRIPT = """
+    local seq = redis.call('incr', KEYS[1])
+    redis.call('rpush', KEYS[2], seq .. ' ' .. ARGV[1])
+    redis.call('ltrim', KEYS[2], -tonumber(ARGV[2]), -1)
+    return seq
+  """
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  def __init__(self):
+    self.lock = threading.RLock()
+    self.following = {}
+    self.followers = {}
+    self.blocking = {}
+    self.blocked_by = {}
+    self.loaded_at = None
+    self.version = None
+    self.seq = 0
+    self.checked_at = None
+
+  @classmethod
+  def get(klass):
+    with klass._instance_lock:
+      if klass._instance is None:
+        klass._instance = klass()
+      graph = klass._instance
+    graph.refresh()
+    return graph
+
+  # (version, seq), or None if redis is down
+  @classmethod
+  def _remote_state(klass):
+    try:
+      version, seq = get_redis().mget([klass.VERSION_KEY, klass.SEQ_KEY])
+    except redis.RedisError:
+      return None
+    return version, int(seq or 0)
+
+  # Forces every worker to reload, for jobs that write follows or blocks directly
+  @classmethod
+  def invalidate(klass):
+    try:
+      get_redis().incr(klass.VERSION_KEY)
+    except redis.RedisError:
+      pass
+
+  @classmethod
+  def _append_change(klass, kind, user_id, other_id, active):
+    try:
+      r = get_redis()
+      return r.register_script(klass.APPEND_SCRIPT)(
+        keys=[klass.SEQ_KEY, klass.CHANGES_KEY],
+        args=["{} {} {} {}".format(kind, user_id, other_id, int(bool(active))), klass.CHANGES_SIZE]
+      )
+    except redis.RedisError:
+      return None
+
+  # Changes after self.seq in order, None if some were already trimmed from the log
+  def _changes_since(self, seq):
+    try:
+      # A few extra in case more were appended since seq was read
+      items = get_redis().lrange(self.CHANGES_KEY, -(seq-self.seq+100), -1)
+    except redis.RedisError:
+      return None
+
+    changes = []
+    for item in items:
+      change_seq, kind, user_id, other_id, active = item.decode().split(" ")
+      change_seq = int(change_seq)
+      if change_seq > self.seq:
+        changes.append((change_seq, kind, int(user_id), int(other_id), active == "1"))
+    if not changes or changes[0][0] != self.seq+1: return None
+    return changes
+
+  def refresh(self):
+    if self.loaded_at is None:
+      return self.load()
+
+    now = time.time()
+    if self.checked_at is not None and now-self.checked_at < self.CHECK_INTERVAL: return
+    self.checked_at = now
+
+    state = self._remote_state()
+    # Without redis other workers' changes can't be seen, fall back to reloading every TTL
+    if state is None:
+      if time.time()-self.loaded_at > self.TTL:
+        self.load()
+      return
+
+    version, seq = state
+    # A sync, or redis lost its keys
+    if version != self.version or seq < self.seq:
+      return self.load()
+    if seq == self.seq: return
+
+    with self.lock:
+      if seq <= self.seq: return
+      changes = self._changes_since(seq)
+      if changes is not None:
+        for change_seq, kind, user_id, other_id, active in changes:
+          self._apply(kind, user_id, other_id, active)
+          self.seq = change_seq
+    # Too far behind the log
+    if changes is None:
+      self.load()
+
+  def load(self):
+    # Read first, changes made while loading are replayed on the next refresh
+    state = self._remote_state()
+    version, seq = state if state is not None else (None, 0)
+
+    # From the primary, a lagging replica would miss changes already counted in seq
+    with read_primary():
+      following = collections.defaultdict(list)
+      followers = collections.defaultdict(list)
+      for user_id, follow_id in db_session.query(
+        Follow.user_id,
+        Follow.follow_id
+      ).filter(
+        Follow.active == True
+      ).yield_per(10000):
+        following[user_id].append(follow_id)
+        followers[follow_id].append(user_id)
+
+      blocking = collections.defaultdict(list)
+      blocked_by = collections.defaultdict(list)
+      for user_id, block_id in db_session.query(
+        Block.user_id,
+        Block.block_id
+      ).filter(
+        Block.active == True
+      ).yield_per(10000):
+        blocking[user_id].append(block_id)
+        blocked_by[block_id].append(user_id)
+
+    def compact(adjacency):
+      return {k: array.array('i', sorted(set(v))) for k, v in adjacency.items()}
+
+    with self.lock:
+      self.following = compact(following)
+      self.followers = compact(followers)
+      self.blocking = compact(blocking)
+      self.blocked_by = compact(blocked_by)
+      self.loaded_at = time.time()
+      self.version = version
+      self.seq = seq
+
+  @classmethod
+  def _contains(klass, ids, x):
+    if ids is None: return False
+    i = bisect.bisect_left(ids, x)
+    return i < len(ids) and ids[i] == x
+
+  @classmethod
+  def _add(klass, adjacency, k, v):
+    ids = adjacency.get(k)
+    if ids is None:
+      adjacency[k] = array.array('i', [v])
+      return
+    i = bisect.bisect_left(ids, v)
+    if i == len(ids) or ids[i] != v:
+      ids.insert(i, v)
+
+  @classmethod
+  def _remove(klass, adjacency, k, v):
+    ids = adjacency.get(k)
+    if ids is None: return
+    i = bisect.bisect_left(ids, v)
+    if i < len(ids) and ids[i] == v:
+      del ids[i]
+
+  def _apply(self, kind, user_id, other_id, active):
+    if kind == self.FOLLOW:
+      forward, backward = self.following, self.followers
+    else:
+      forward, backward = self.blocking, self.blocked_by
+
+    with self.lock:
+      if active:
+        self._add(forward, user_id, other_id)
+        self._add(backward, other_id, user_id)
+      else:
+        self._remove(forward, user_id, other_id)
+        self._remove(backward, other_id, user_id)
+
+  def _set_edge(self, kind, user_id, other_id, active):
+    with self.lock:
+      self._apply(kind, user_id, other_id, active)
+      seq = self._append_change(kind, user_id, other_id, active)
+      # Skip replaying our own change unless another worker wrote in between
+      if seq is not None and seq == self.seq+1:
+        self.seq = seq
+
+  def set_follow(self, user_id, follow_id, active):
+    self._set_edge(self.FOLLOW, user_id, follow_id, active)
+
+  def set_block(self, user_id, block_id, active):
+    self._set_edge(self.BLOCK, user_id, block_id, active)
+
+  def blocks(self, user_id, block_id):
+    return self._contains(self.blocking.get(user_id), block_id)
+
+  def blocks_either(self, user_id_a, user_id_b):
+    return self.blocks(user_id_a, user_id_b) or self.blocks(user_id_b, user_id_a)
+
+  def follows(self, user_id, follow_id):
+    return (
+      self._contains(self.following.get(user_id), follow_id)
+      and not self.blocks_either(user_id, follow_id)
+    )
+
+  def mutual(self, user_id_a, user_id_b):
+    return self.follows(user_id_a, user_id_b) and self.follows(user_id_b, user_id_a)
+
+  def block_ids(self, user_id):
+    return set(self.blocking.get(user_id, ())) | set(self.blocked_by.get(user_id, ()))
+
+  def blocked_ids(self, user_id):
+    return list(self.blocking.get(user_id, ()))
+
+  def following_ids(self, user_id):
+    block_ids = self.block_ids(user_id)
+    return [x for x in self.following.get(user_id, ()) if x not in block_ids]
+
+  def follower_ids(self, user_id):
+    block_ids = self.block_ids(user_id)
+    return [x for x in self.followers.get(user_id, ()) if x not in block_ids]
+
+  def mutual_ids(self, user_id):
+    follower_ids = set(self.follower_ids(user_id))
+    return [x for x in self.following_ids(user_id) if x in follower_ids]
+
+  def excluded_suggestion_ids(self, user_id):
+    excluded = self.block_ids(user_id)
+    excluded.update(self.following.get(user_id, ()))
+    excluded.add(user_id)
+    return excluded
+
+  def friends_of_friends(self, user_id):
+    excluded = self.excluded_suggestion_ids(user_id)
+
+    counts = collections.Counter()
+    for friend_id in self.following_ids(user_id):
+      for candidate_id in self.following.get(friend_id, ()):
+        if candidate_id not in excluded:
+          counts[candidate_id] += 1
+    return counts
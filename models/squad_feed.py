@@ -0,0 +1,50 @@
+import json
+
+import redis
+
+from helpers.redis_helper import get_redis
+
+from .base import db_session
+from .squad_user import SquadUser
+
+# Per-squad cache of ranked feed pages, see SquadController.get_squad_events
+class SquadFeed:
+  TTL = 60
+  CACHE_KEY = "squad_feed:{}"
+
+  @classmethod
+  def cache_key(klass, squad_id):
+    return klass.CACHE_KEY.format(squad_id)
+
+  @classmethod
+  def get(klass, squad_id, field):
+    try:
+      cached = get_redis().hget(klass.cache_key(squad_id), field)
+    except redis.RedisError:
+      return None
+    if cached is None: return None
+    return json.loads(cached)
+
+  @classmethod
+  def set(klass, squad_id, field, value):
+    try:
+      key = klass.cache_key(squad_id)
+      pipe = get_redis().pipeline()
+      pipe.hset(key, field, json.dumps(value))
+      pipe.expire(key, klass.TTL)
+      pipe.execute()
+    except redis.RedisError:
+      pass
+
+  @classmethod
+  def invalidate(klass, *squad_ids):
+    if not squad_ids: return
+    try:
+      get_redis().delete(*[klass.cache_key(x) for x in squad_ids])
+    except redis.RedisError:
+      pass
+
+  @classmethod
+  def invalidate_user(klass, user_id):
+    squad_ids = [x for x, in db_session.query(SquadUser.squad_id).filter(SquadUser.user_id == user_id)]
+    klass.invalidate(*squad_ids)
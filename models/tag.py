@@ -31,10 +31,14 @@ class Tag(Base):
   ACCOLADES = "accolades"
   NEARBY = "nearby"
   OPEN_NOW = "open"
+  UPCOMING = "upcoming"
+  WEEKEND = "weekend"
   FLAGS = [
     ACCOLADES,
     NEARBY,
-    OPEN_NOW
+    OPEN_NOW,
+    UPCOMING,
+    WEEKEND
   ]
 
   __tablename__ = 'tags'
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+class UserCounter(Base):
+  __tablename__ = 'user_counters'
+  user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+  follower_count = Column(Integer, nullable=False, default=0)
+  event_count = Column(Integer, nullable=False, default=0)
+  updated_at = Column(DateTime)
+
+  user = relationship('User', uselist=False)
@@ -54,12 +54,36 @@ class UserEvent(Base):
       if interest_key == key: return interest_level
     return None
 
+  @classmethod
+  def interest_key_for(klass, interest):
+    if interest is not None:
+      for interest_key, interest_level in klass.INTEREST_KEYS.items():
+        if interest >= interest_level: return interest_key
+    return None
+
+  # Interest after clicking interest_key, where done toggles on top of go/maybe
+  @classmethod
+  def next_interest(klass, interest, interest_key):
+    if interest is None:
+      return klass.interest_level(interest_key)
+
+    current_interest_key = klass.interest_key_for(interest)
+    if interest_key == klass.DONE:
+      if current_interest_key == interest_key:
+        return interest-2
+      return interest+2
+    elif current_interest_key == interest_key:
+      return None
+    return klass.interest_level(interest_key)
+
+  # Matches the interest counted in Event.card_user_count
+  @classmethod
+  def is_counted(klass, interest):
+    return interest is not None and interest > klass.interest_level(klass.SKIP) and interest <= max(klass.DONE_LEVELS)
+
   @property
   def interest_key(self):
-    if self.interest is not None:
-      for interest_key, interest_level in self.INTEREST_KEYS.items():
-        if self.interest >= interest_level: return interest_key
-    return None
+    return self.interest_key_for(self.interest)
 
   @validates('interest')
   def validate_interest(self, key, val):
@@ -0,0 +1,160 @@
+from sqlalchemy import and_, exists, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from .base import db_session
+from .block import Block
+from .event import Event
+from .follow import Follow
+from .user import User
+from .user_counter import UserCounter
+from .user_event import UserEvent
+
+# Profile card counters and relationship flags for (viewer, subject) in one query
+class UserStats:
+  def __init__(
+    self,
+    user_id,
+    follower_count=0, event_count=0,
+    is_follower=False, is_following=False, is_blocked=False, is_blocked_either=False
+  ):
+    self.user_id = user_id
+    self.follower_count = follower_count or 0
+    self.event_count = event_count or 0
+    self.is_follower = bool(is_follower)
+    self.is_following = bool(is_following)
+    self.is_blocked = bool(is_blocked)
+    self.is_blocked_either = bool(is_blocked_either)
+
+  @classmethod
+  def _blocks_either(klass, user_id_a, user_id_b):
+    return exists().where(
+      and_(
+        Block.active == True,
+        or_(
+          and_(Block.user_id == user_id_a, Block.block_id == user_id_b),
+          and_(Block.user_id == user_id_b, Block.block_id == user_id_a)
+        )
+      )
+    ).correlate_except(Block)
+
+  @classmethod
+  def _follows(klass, user_id, follow_id):
+    return exists().where(
+      and_(
+        Follow.user_id == user_id,
+        Follow.follow_id == follow_id,
+        Follow.active == True
+      )
+    ).correlate_except(Follow)
+
+  # Matches User.follower_users_count
+  @classmethod
+  def live_follower_count(klass, subject_id):
+    return select([
+      func.count(Follow.user_id)
+    ]).where(
+      and_(
+        Follow.follow_id == subject_id,
+        Follow.active == True,
+        ~klass._blocks_either(subject_id, Follow.user_id)
+      )
+    ).correlate_except(Follow).as_scalar()
+
+  # Matches User.active_user_events_count
+  @classmethod
+  def live_event_count(klass, subject_id):
+    return select([
+      func.count(UserEvent.event_id)
+    ]).select_from(
+      UserEvent.__table__.join(Event.__table__, UserEvent.event_id == Event.event_id)
+    ).where(
+      and_(
+        UserEvent.user_id == subject_id,
+        UserEvent.interest.in_(UserEvent.INTERESTED_LEVELS)
+      )
+    ).correlate_except(UserEvent, Event).as_scalar()
+
+  @classmethod
+  def follower_count(klass, subject_id):
+    cached = select([UserCounter.follower_count]).where(UserCounter.user_id == subject_id).correlate_except(UserCounter).as_scalar()
+    return func.coalesce(cached, klass.live_follower_count(subject_id))
+
+  @classmethod
+  def event_count(klass, subject_id):
+    cached = select([UserCounter.event_count]).where(UserCounter.user_id == subject_id).correlate_except(UserCounter).as_scalar()
+    return func.coalesce(cached, klass.live_event_count(subject_id))
+
+  @classmethod
+  def columns(klass, subject_id, viewer_id=None):
+    columns = [
+      klass.follower_count(subject_id).label('follower_count'),
+      klass.event_count(subject_id).label('event_count')
+    ]
+
+    if viewer_id is None:
+      false = literal(False)
+      return columns + [
+        false.label('is_follower'),
+        false.label('is_following'),
+        false.label('is_blocked'),
+        false.label('is_blocked_either')
+      ]
+
+    blocks_either = klass._blocks_either(viewer_id, subject_id)
+    return columns + [
+      and_(klass._follows(subject_id, viewer_id), ~blocks_either).label('is_follower'),
+      and_(klass._follows(viewer_id, subject_id), ~blocks_either).label('is_following'),
+      exists().where(
+        and_(
+          Block.user_id == viewer_id,
+          Block.block_id == subject_id,
+          Block.active == True
+        )
+      ).correlate_except(Block).label('is_blocked'),
+      blocks_either.label('is_blocked_either')
+    ]
+
+  @classmethod
+  def get(klass, user, viewer=None):
+    if user is None: return None
+    viewer_id = viewer.user_id if viewer else None
+
+    row = db_session.query(*klass.columns(user.user_id, viewer_id)).one()
+    return klass(user.user_id, *row)
+
+  def apply(self, user):
+    user.card_follower_count = self.follower_count
+    user.card_event_count = self.event_count
+    user.card_is_follower = self.is_follower
+    user.card_is_following = self.is_following
+    user.card_is_blocked = self.is_blocked
+    return user
+
+  @classmethod
+  def refresh_counters(klass, user_ids=None, commit=True):
+    counters = select([
+      User.user_id,
+      klass.live_follower_count(User.user_id),
+      klass.live_event_count(User.user_id)
+    ])
+    if user_ids is not None:
+      user_ids = [x for x in user_ids if x is not None]
+      if not user_ids: return
+      counters = counters.where(User.user_id.in_(user_ids))
+
+    stmt = insert(UserCounter.__table__).from_select(
+      ['user_id', 'follower_count', 'event_count'],
+      counters
+    )
+    stmt = stmt.on_conflict_do_update(
+      index_elements=['user_id'],
+      set_={
+        'follower_count': stmt.excluded.follower_count,
+        'event_count': stmt.excluded.event_count,
+        'updated_at': func.now()
+      }
+    )
+    db_session.execute(stmt)
+    if commit:
+      db_session.commit()
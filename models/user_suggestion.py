@@ -0,0 +1,19 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+class UserSuggestion(Base):
+  TOP_K = 20
+
+  __tablename__ = 'user_suggestions'
+  user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+  suggest_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+  rank = Column(Integer, nullable=False)
+  score = Column(Float, nullable=False, default=0)
+  mutual_count = Column(Integer, nullable=False, default=0)
+  shared_event_count = Column(Integer, nullable=False, default=0)
+  updated_at = Column(DateTime)
+
+  user = relationship('User', uselist=False, foreign_keys=[user_id])
+  suggest = relationship('User', uselist=False, foreign_keys=[suggest_id])
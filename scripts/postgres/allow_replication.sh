@@ -0,0 +1,3 @@
+#!/bin/bash
+# Lets postgres_replica in docker-compose.yml stream from this instance
+echo "host replication all all md5" >> "$PGDATA/pg_hba.conf"
\ No newline at end of file
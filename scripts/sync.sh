@@ -2,4 +2,19 @@ echo 'Running DB migrations...'
 alembic upgrade head
 
 ./scripts/sync_tvm.sh
-./scripts/sync_food.sh
\ No newline at end of file
+./scripts/sync_food.sh
+
+echo 'Building event cards...'
+python -m models.data.transform_event_cards
+
+echo 'Refreshing user counters...'
+python -m models.data.transform_user_counters
+
+echo 'Ranking user suggestions...'
+python -m models.data.transform_user_suggestions
+
+echo 'Computing similar events...'
+python -m models.data.transform_event_similarities
+
+echo 'Training event recommender...'
+python -m models.data.train_als
\ No newline at end of file
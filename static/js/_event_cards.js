@@ -0,0 +1,71 @@
+var EventCards = EventCards || {};
+
+EventCards.render = function(card){
+  let elem = $($('#event_card_template').html());
+  elem.attr('id', 'event_card_'+card.event_id);
+  elem.find('.event_container').attr('id', 'event_'+card.event_id);
+  elem.find('.event_header').attr('href', card.url);
+
+  if(card.img_url){
+    if(!card.accolades){ elem.find('.accolade').remove(); }
+    if(card.user_count){
+      elem.find('.event_users_count').text(card.user_count_display);
+    }else{
+      elem.find('.event_users').remove();
+    }
+    let imgId = 'event_img_'+card.event_id;
+    elem.find('.event_img')
+      .attr('id', imgId)
+      .attr('onerror', "Application.removeElem('#"+imgId+"')")
+      .attr('src', card.img_url);
+  }else{
+    elem.find('.event_accolades, .event_users, .event_img_wrapper').remove();
+  }
+
+  elem.find('.event_name').text(card.display_name);
+  if(card.display_address){
+    elem.find('.event_venue_name').text(card.display_address);
+  }else{
+    elem.find('.event_venue_name').remove();
+  }
+
+  let tags = elem.find('.event_tags');
+  card.chips.forEach(function(chip){
+    $('<a>', {
+      'class': 'cap_button nav_link_get '+(chip.selected ? 'selected' : ''),
+      'href': chip.url
+    }).text(chip.chip_name).appendTo(tags);
+  });
+
+  elem.find('.event_choice').each(function(){
+    $(this).attr('href', card.url).attr('data', JSON.stringify({
+      'target': '#event_'+card.event_id,
+      'choice': $(this).attr('data-choice'),
+      'card': 'true',
+      'ct': String(card.user_count)
+    })).removeAttr('data-choice');
+  });
+
+  return elem;
+}
+
+EventCards.getNext = function(target, url, spinner){
+  Spinner.show(spinner);
+
+  $.getJSON(url).done(function(response) {
+    let list = $(target);
+    // Paging is driven by the api cursor from here on
+    list.find('.pagination').remove();
+    response.events.forEach(function(card){
+      list.append(EventCards.render(card));
+    });
+    list.attr('data-next', response.next_url || '');
+
+    if(response.events.length > 0){
+      history.pushState({'url': response.page_url}, null, response.page_url);
+    }
+    Spinner.hide(spinner);
+  }).fail(function(xhr, status, error) {
+    Spinner.hide(spinner);
+  });
+}
\ No newline at end of file
@@ -60,6 +60,17 @@ Scroll.getNext = function(){
 
   if((scrollHeight-scrollPosition)/scrollHeight < 0.1){
     Scroll.disable();
+
+    // Explore pages scroll through the json api when the page offers it
+    let apiUrl = $('#event_list').attr('data-next');
+    if(apiUrl !== undefined){
+      if(apiUrl && Scroll.lastScrollUrl != apiUrl){
+        Scroll.lastScrollUrl = apiUrl;
+        EventCards.getNext('#event_list', apiUrl, $('.entity_list_spinner:last'));
+      }
+      return;
+    }
+
     let nextUrl = $('.pagination:last').find('a:first').attr('href');
     if(nextUrl){
       if(Scroll.lastScrollUrl != nextUrl){
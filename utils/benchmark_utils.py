@@ -0,0 +1,159 @@
+import contextlib
+import datetime
+import json
+import math
+import platform
+import time
+
+from utils.get_from import get_from
+from utils.time_utils import format_time_elapsed
+
+def percentile(values, pct):
+	if not values: return None
+
+	ordered = sorted(values)
+	k = (len(ordered)-1) * (pct/100.0)
+	lower = int(math.floor(k))
+	upper = int(math.ceil(k))
+	if lower == upper: return ordered[lower]
+	return ordered[lower] + (ordered[upper]-ordered[lower]) * (k-lower)
+
+def summarize(timings):
+	n = len(timings)
+	mean = sum(timings)/n if n else None
+	stdev = math.sqrt(sum((t-mean)**2 for t in timings)/(n-1)) if n > 1 else 0.0
+
+	return {
+		'n': n,
+		'min': min(timings) if n else None,
+		'max': max(timings) if n else None,
+		'mean': mean,
+		'stdev': stdev,
+		'p50': percentile(timings, 50),
+		'p90': percentile(timings, 90),
+		'p99': percentile(timings, 99)
+	}
+
+class Benchmark:
+	MICRO = "micro"
+	MACRO = "macro"
+
+	def __init__(self, name, fn, kind=MACRO, warmup=2, repeat=10, number=1, context=None):
+		self.name = name
+		self.fn = fn
+		self.kind = kind
+		self.warmup = warmup
+		self.repeat = repeat
+		self.number = number
+		self.context = context
+
+	def _context(self):
+		if self.context is None:
+			return contextlib.ExitStack()
+		return self.context()
+
+	def run(self, warmup=None, repeat=None):
+		warmup = self.warmup if warmup is None else warmup
+		repeat = self.repeat if repeat is None else repeat
+
+		timings = []
+		with self._context():
+			for i in range(warmup):
+				self.fn()
+
+			for i in range(repeat):
+				start_time = time.perf_counter()
+				for j in range(self.number):
+					self.fn()
+				end_time = time.perf_counter()
+				timings.append((end_time-start_time)/self.number)
+
+		results = summarize(timings)
+		results.update({
+			'kind': self.kind,
+			'warmup': warmup,
+			'repeat': repeat,
+			'number': self.number
+		})
+		return results
+
+class BenchmarkSuite:
+	def __init__(self, name):
+		self.name = name
+		self.benchmarks = []
+
+	def add(self, benchmark):
+		self.benchmarks.append(benchmark)
+		return benchmark
+
+	def benchmark(self, name=None, **kwargs):
+		def decorator(fn):
+			self.add(Benchmark(name or fn.__name__, fn, **kwargs))
+			return fn
+		return decorator
+
+	def run(self, names=None, kind=None, warmup=None, repeat=None, verbose=True):
+		results = {}
+		for b in self.benchmarks:
+			if names and not any(n in b.name for n in names): continue
+			if kind and b.kind != kind: continue
+
+			results[b.name] = b.run(warmup=warmup, repeat=repeat)
+			if verbose:
+				print("benchmark {:<48} p50: {:>10} | p90: {:>10} | p99: {:>10}".format(
+					b.name,
+					format_time_elapsed(results[b.name]['p50']),
+					format_time_elapsed(results[b.name]['p90']),
+					format_time_elapsed(results[b.name]['p99'])
+				))
+
+		return {
+			'suite': self.name,
+			'created_at': datetime.datetime.now().isoformat(),
+			'python': platform.python_version(),
+			'results': results
+		}
+
+def save_results(results, path):
+	with open(path, "w") as f:
+		json.dump(results, f, indent=2, sort_keys=True)
+
+def load_results(path):
+	with open(path) as f:
+		return json.load(f)
+
+def compare_results(results, baseline, stat='p50', threshold=0.1):
+	comparisons = {}
+	for name, cur in results['results'].items():
+		base_value = get_from(baseline, ['results', name, stat])
+		cur_value = cur[stat]
+		if not base_value or cur_value is None:
+			comparisons[name] = {'status': 'new', 'current': cur_value}
+			continue
+
+		ratio = cur_value/base_value
+		if ratio > 1+threshold: status = 'regressed'
+		elif ratio < 1-threshold: status = 'improved'
+		else: status = 'unchanged'
+
+		comparisons[name] = {
+			'status': status,
+			'baseline': base_value,
+			'current': cur_value,
+			'ratio': ratio
+		}
+	return comparisons
+
+def print_comparison(comparisons, stat='p50'):
+	for name, c in sorted(comparisons.items()):
+		if c['status'] == 'new':
+			print("compare   {:<48} {:>10} (no baseline)".format(name, format_time_elapsed(c['current'])))
+		else:
+			print("compare   {:<48} {} {:>10} -> {:>10} ({:+.1f}%) {}".format(
+				name,
+				stat,
+				format_time_elapsed(c['baseline']),
+				format_time_elapsed(c['current']),
+				(c['ratio']-1)*100,
+				c['status'].upper()
+			))
@@ -32,6 +32,24 @@ class TimeInterval:
 
 		return datetime.datetime(cur_date.year, cur_date.month, day)
 
+def format_time_elapsed(time_elapsed):
+	time_components = []
+	seconds_left = time_elapsed
+
+	hours = int(seconds_left/3600)
+	seconds_left -= hours*3600
+	if hours > 0: time_components.append("{}h".format(hours))
+
+	minutes = int(seconds_left/60)
+	seconds_left -= minutes*60
+	if minutes > 0: time_components.append("{}m".format(minutes))
+
+	if time_elapsed < 1:
+		time_components.append("{:.2f}ms".format(seconds_left*1000))
+	else:
+		time_components.append("{:.2f}s".format(seconds_left))
+	return " ".join(time_components)
+
 def benchmark_time(name=None, print_args=True):
 	def decorator(fn):
 		def fn_body(*args, **kwargs):
@@ -42,20 +60,7 @@ def benchmark_time(name=None, print_args=True):
 			fn_name = inspect.getmodule(fn).__name__
 			end_time = datetime.datetime.now()
 			time_elapsed=(end_time-start_time).total_seconds()
-
-			time_components = []
-			seconds_left = time_elapsed
-
-			hours = int(seconds_left/3600)
-			seconds_left -= hours*3600
-			if hours > 0: time_components.append("{}h".format(hours))
-
-			minutes = int(seconds_left/60)
-			seconds_left -= minutes*60
-			if minutes > 0: time_components.append("{}m".format(minutes))
-
-			time_components.append("{:.2f}s".format(seconds_left))
-			time_str = " ".join(time_components)
+			time_str = format_time_elapsed(time_elapsed)
 
 			arg_str = " (args={} | kwargs={})".format(args, kwargs) if print_args else ""
 			print("benchmark_time Name:    {}{}".format((name or fn_name), arg_str))